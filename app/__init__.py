@@ -2,14 +2,50 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from dotenv import load_dotenv
+import logging
 import os
+import time
 from flask_cors import CORS
 
 db = SQLAlchemy()
 migrate = Migrate()
-load_dotenv()
+
+def end_read():
+    """End the session's read-only transaction, returning its pooled connection.
+
+    Call it between a cache read and a slow upstream call. Objects already
+    loaded stay in the session and reload on next access; a session holding
+    unsaved changes is left alone.
+    """
+    if not (db.session.new or db.session.dirty or db.session.deleted):
+        db.session.commit()
+
+def engine_options(database_uri):
+    """Connection pool settings for each worker process's engine.
+
+    Every worker holds up to DB_POOL_SIZE + DB_MAX_OVERFLOW connections, so
+    keep workers * (size + overflow) under the database's connection limit.
+    Connections are checked before use and replaced after DB_POOL_RECYCLE
+    seconds, as hosted Postgres drops idle ones.
+    """
+    options = {
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true',
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+    }
+    if database_uri and not database_uri.startswith('sqlite'):
+        options.update(
+            pool_size=int(os.getenv('DB_POOL_SIZE', 5)),
+            max_overflow=int(os.getenv('DB_MAX_OVERFLOW', 5)),
+            pool_timeout=float(os.getenv('DB_POOL_TIMEOUT', 10)),
+        )
+    return options
 
 def create_app(test_config=None):
+    started = time.perf_counter()
+    # Before any app module is imported: several read their settings at import time
+    load_dotenv()
+    from app.log import configure_logging
+    configure_logging()
     app = Flask(__name__)
     CORS(app, supports_credentials=True, origins='*')
     app.config['CORS_HEADERS'] = 'Content-Type'
@@ -24,9 +60,20 @@ def create_app(test_config=None):
         app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
         app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get(
             "SQLALCHEMY_TEST_DATABASE_URI")
-        
+    app.config['SPOTIFY_CLIENT_ID'] = os.getenv('SPOTIFY_CLIENT_ID')
+    app.config['SPOTIFY_REDIRECT_URI'] = os.getenv('SPOTIFY_REDIRECT_URI')
+    app.config['SPOTIFY_SCOPES'] = os.getenv('SPOTIFY_SCOPES')
+    if test_config:
+        app.config.update(test_config)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+
     from models.user import User
     from models.temp import TemporaryStorage
+    from models.geocode import GeocodeCache
+    from models.chart import CountryChart
+    from models.track_features import TrackFeatures
+    from models.job import PlaylistJob
+    from models.weather_playlist import WeatherPlaylist
     db.init_app(app)
     migrate.init_app(app, db)
 
@@ -39,4 +86,40 @@ def create_app(test_config=None):
     from app.routes.weather import weather_routes
     app.register_blueprint(weather_routes)
 
-    return app
\ No newline at end of file
+    from app.routes.metrics import metrics_routes
+    app.register_blueprint(metrics_routes)
+
+    from app.services.scheduler import scheduler
+    from app.routes.spotify_auth import refresh_expiring_tokens
+    scheduler.add_job('refresh_expiring_tokens', int(os.getenv('TOKEN_REFRESH_INTERVAL', 60)), refresh_expiring_tokens)
+    from app.services.ephemeral import get_ephemeral_store
+    scheduler.add_job('sweep_temporary_storage', int(os.getenv('TEMP_STORAGE_SWEEP_INTERVAL', 300)),
+                      lambda: get_ephemeral_store().cleanup())
+    from app.services.jobs import dispatch_queued
+    scheduler.add_job('dispatch_playlist_jobs', int(os.getenv('JOB_DISPATCH_INTERVAL', 5)), dispatch_queued)
+    from app.services.weather_profiles import refresh_profiles
+    scheduler.add_job('refresh_weather_profiles', int(os.getenv('WEATHER_PROFILE_REFRESH_INTERVAL', 600)), refresh_profiles)
+    from app.services import metrics
+    scheduler.add_job('flush_metrics', 5, metrics.flush)
+    # A preloading server builds the app once in its master and calls init_worker() after each fork
+    if os.getenv('DEFER_WORKER_INIT', 'false').lower() != 'true':
+        init_worker(app)
+
+    logging.getLogger(__name__).info('App created', extra={'fields': {
+        'startup_seconds': round(time.perf_counter() - started, 3)}})
+    return app
+
+def init_worker(app):
+    """Set up the resources each serving process needs for itself.
+
+    Everything else that is per process (HTTP session, executors, metrics
+    snapshot) is keyed on the pid and rebuilt lazily on first use after fork.
+    """
+    from app.log import configure_logging
+    from app.services.scheduler import scheduler
+    configure_logging()
+    # Connections pooled before fork would be shared with the master and the other workers
+    with app.app_context():
+        db.engine.dispose(close=False)
+    if not app.config.get("TESTING"):
+        scheduler.start(app)
\ No newline at end of file
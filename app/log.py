@@ -0,0 +1,126 @@
+"""Structured, non-blocking logging for the app.
+
+Records are formatted as one JSON object per line by a background listener
+thread; request threads only enqueue them, so a slow stdout never stalls a
+request. Secrets (bearer tokens, access/refresh tokens, PKCE verifiers, API
+keys in URLs) are redacted before a record is queued, and DEBUG/INFO records
+can be sampled.
+
+    LOG_LEVEL         root level (default INFO)
+    LOG_SAMPLE_RATE   fraction of DEBUG/INFO records kept, 0-1 (default 1)
+
+Pass structured fields with ``extra={'fields': {...}}``.
+"""
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+REDACTED = '[REDACTED]'
+_SECRET_PATTERNS = [
+    (re.compile(r'(Bearer\s+)[A-Za-z0-9._~+/=-]+'), r'\1' + REDACTED),
+    (re.compile(r'''(["']?(?:access_token|refresh_token|code_verifier|client_secret)["']?\s*[:=]\s*["']?)[^"'&\s,}]+'''),
+     r'\1' + REDACTED),
+    (re.compile(r'([?&](?:key|appid|api_key|code)=)[^&\s]+'), r'\1' + REDACTED),
+]
+
+_listener = None
+_listener_pid = None
+_sampling = None
+_plain_formatter = logging.Formatter()
+
+
+def redact(text):
+    for pattern, replacement in _SECRET_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class RedactingFilter(logging.Filter):
+    def filter(self, record):
+        record.msg = redact(record.getMessage())
+        record.args = None
+        if record.exc_info:
+            # Tracebacks quote URLs and payloads too: queue only their redacted text
+            record.exc_text = redact(_plain_formatter.formatException(record.exc_info))
+            record.exc_info = None
+        if record.stack_info:
+            record.stack_info = redact(record.stack_info)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            record.fields = {k: redact(v) if isinstance(v, str) else v for k, v in fields.items()}
+        return True
+
+
+class RedactedQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # The stock prepare() re-formats the record, folding the traceback into msg;
+        # RedactingFilter has already flattened it, so pass it on with exc_text intact.
+        return copy.copy(record)
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            record.exc_text = redact(self.formatException(record.exc_info))
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, default=str)
+
+
+def configure_logging():
+    """Route the root logger through a queue; safe to call again in a forked worker.
+
+    Calling it again in the same process re-reads LOG_LEVEL and LOG_SAMPLE_RATE,
+    e.g. once create_app() has loaded .env.
+    """
+    global _listener, _listener_pid, _sampling
+    if _listener is not None and _listener_pid == os.getpid():
+        logging.getLogger().setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+        _sampling.rate = float(os.getenv('LOG_SAMPLE_RATE', 1))
+        return
+    if _listener is not None:
+        # Inherited from the parent across fork: its thread doesn't exist here
+        _listener = None
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(JsonFormatter())
+    log_queue = queue.SimpleQueue()
+    queue_handler = RedactedQueueHandler(log_queue)
+    _sampling = SamplingFilter(float(os.getenv('LOG_SAMPLE_RATE', 1)))
+    queue_handler.addFilter(_sampling)
+    queue_handler.addFilter(RedactingFilter())
+
+    root = logging.getLogger()
+    for handler in [h for h in root.handlers if isinstance(h, QueueHandler)]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+
+    _listener = QueueListener(log_queue, stream_handler)
+    _listener.start()
+    _listener_pid = os.getpid()
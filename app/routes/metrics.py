@@ -0,0 +1,9 @@
+from flask import Blueprint, Response
+from app.services import metrics
+
+metrics_routes = Blueprint('metrics_routes', __name__)
+
+
+@metrics_routes.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
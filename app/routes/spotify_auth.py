@@ -1,26 +1,33 @@
-from flask import Blueprint, redirect, request, jsonify, url_for, make_response
+from flask import Blueprint, current_app, redirect, request, jsonify, url_for, make_response
+from sqlalchemy import func, or_
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm.exc import NoResultFound
 from datetime import datetime, timedelta
 import urllib.parse
 from urllib.parse import urlencode
 import os
-import requests
 from models.user import User
-from models.temp import TemporaryStorage  
 from app import db
+from app.services import http_client
+from app.services.cache import MISSING, TTLCache
+from app.services.ephemeral import get_ephemeral_store
+from app.services.spotify import API_BASE_URL
+from app.services.upstreams import SPOTIFY_ACCOUNTS_BASE_URL
 from flask_cors import cross_origin
 import base64
 import hashlib
+import logging
 
 # Spotify API endpoints and credentials
-AUTH_URL = 'https://accounts.spotify.com/authorize'
-TOKEN_URL = 'https://accounts.spotify.com/api/token'
-API_BASE_URL = 'https://api.spotify.com/v1/'
-SPOTIFY_CLIENT_ID = os.getenv('SPOTIFY_CLIENT_ID')
-SPOTIFY_REDIRECT_URI = os.getenv('SPOTIFY_REDIRECT_URI')
-SPOTIFY_SCOPES = os.getenv('SPOTIFY_SCOPES')
+AUTH_URL = f'{SPOTIFY_ACCOUNTS_BASE_URL}/authorize'
+TOKEN_URL = f'{SPOTIFY_ACCOUNTS_BASE_URL}/api/token'
 
 spotify_auth_routes = Blueprint('spotify_auth_routes', __name__)
+logger = logging.getLogger(__name__)
+
+# access token -> user.json(); entries never outlive the token's own expiry
+_token_cache = TTLCache(maxsize=int(os.getenv('TOKEN_CACHE_SIZE', 4096)), name='token',
+                        ttl=int(os.getenv('TOKEN_CACHE_TTL', 300)))
 
 def generate_code_verifier_and_challenge():
     code_verifier = base64.urlsafe_b64encode(os.urandom(32)).rstrip(b'=').decode('utf-8')
@@ -35,10 +42,10 @@ def generate_unique_session_id():
 def login():
     code_verifier, code_challenge = generate_code_verifier_and_challenge()
     params = {
-        'client_id': SPOTIFY_CLIENT_ID,
+        'client_id': current_app.config['SPOTIFY_CLIENT_ID'],
         'response_type': 'code',
-        'redirect_uri': SPOTIFY_REDIRECT_URI,
-        'scope': SPOTIFY_SCOPES,
+        'redirect_uri': current_app.config['SPOTIFY_REDIRECT_URI'],
+        'scope': current_app.config['SPOTIFY_SCOPES'],
         'code_challenge_method': 'S256',
         'code_challenge': code_challenge,
         'show_dialog': 'true'
@@ -46,12 +53,8 @@ def login():
     auth_url = f'{AUTH_URL}?{urllib.parse.urlencode(params)}'
     session_id = generate_unique_session_id()
     
-    # Calculate the expiration time (e.g., 1 hour from now)
-    expires_at = datetime.utcnow() + timedelta(hours=1)
-    
-    temp_storage = TemporaryStorage(key=session_id, value=code_verifier, expires_at=expires_at)
-    db.session.add(temp_storage)
-    db.session.commit()
+    # Keep the verifier for 1 hour in the configured ephemeral backend
+    get_ephemeral_store().set(session_id, code_verifier, ttl=3600)
     
     response = make_response(jsonify({'auth_url': auth_url, 'session_id': session_id}))
     # response.set_cookie('session_id', value=session_id, secure=False, httponly=False, samesite='Lax')
@@ -76,13 +79,10 @@ def callback():
         return jsonify({"error": "Authorization code not provided"}), 400
 
     session_id = request.args.get('session_id')
-    print("session_id", session_id)
       # Assuming session_id is stored in cookies
-    temp_storage = TemporaryStorage.query.filter_by(key=session_id).first()
-    if not temp_storage:
+    code_verifier = get_ephemeral_store().pop(session_id)
+    if not code_verifier:
         return jsonify({"error": "Session not found"}), 400
-    code_verifier = temp_storage.value
-    print("code_verifier: ", code_verifier)
 
     token_info = exchange_code_for_access_token(code, code_verifier)
     if 'access_token' not in token_info:
@@ -100,60 +100,219 @@ def callback():
     return prepare_response(access_token)
 
 def exchange_code_for_access_token(code, code_verifier):
-    print("inside exchange_code_for_access_token")
+    logger.debug("inside exchange_code_for_access_token")
     req_body = {
         'grant_type': 'authorization_code',
         'code': code,
-        'redirect_uri': SPOTIFY_REDIRECT_URI,
-        'client_id': SPOTIFY_CLIENT_ID,
+        'redirect_uri': current_app.config['SPOTIFY_REDIRECT_URI'],
+        'client_id': current_app.config['SPOTIFY_CLIENT_ID'],
         'code_verifier': code_verifier
     }
     headers = {
         'Content-Type': 'application/x-www-form-urlencoded'
     }
-    response = requests.post(TOKEN_URL, data=urlencode(req_body), headers=headers)
-    print(response.json())
+    response = http_client.post(TOKEN_URL, data=urlencode(req_body), headers=headers)
+    token_info = response.json()
+    logger.info('Token exchange finished', extra={'fields': {'status': response.status_code,
+                                                             'error': token_info.get('error')}})
+    return token_info
+
+def refresh_access_token(refresh_token):
+    req_body = {
+        'grant_type': 'refresh_token',
+        'refresh_token': refresh_token,
+        'client_id': current_app.config['SPOTIFY_CLIENT_ID']
+    }
+    headers = {
+        'Content-Type': 'application/x-www-form-urlencoded'
+    }
+    response = http_client.post(TOKEN_URL, data=urlencode(req_body), headers=headers)
     return response.json()
 
+class TokenRefreshError(ValueError):
+    def __init__(self, message, error=None):
+        super().__init__(message)
+        self.error = error
+
+def refresh_user_token(user):
+    """Run the refresh-token grant for ``user`` and update the row in place; the caller commits."""
+    token_info = refresh_access_token(user.refresh_token)
+    if 'access_token' not in token_info:
+        raise TokenRefreshError(token_info.get('error_description') or token_info.get('error', 'Failed to refresh access token'),
+                                token_info.get('error'))
+    # The client may still present the token it was handed at login until it picks up the new one
+    user.previous_access_token = user.access_token
+    user.access_token = token_info['access_token']
+    user.refresh_token = token_info.get('refresh_token') or user.refresh_token
+    user.expires_at = datetime.now() + timedelta(seconds=token_info['expires_in'])
+    user.refresh_failures = 0
+    user.refresh_retry_at = None
+    return user
+
+def _back_off(user):
+    # Transient failure (network, Spotify 5xx): retry later, doubling the wait each time
+    user.refresh_failures = (user.refresh_failures or 0) + 1
+    delay = int(os.getenv('TOKEN_REFRESH_BACKOFF_SECONDS', 60)) * 2 ** (user.refresh_failures - 1)
+    user.refresh_retry_at = datetime.now() + timedelta(seconds=min(delay, int(os.getenv('TOKEN_REFRESH_BACKOFF_MAX_SECONDS', 3600))))
+
+def refresh_expiring_tokens(batch_size=None, lead_seconds=None):
+    """Refresh users whose access token expires within the lead window, one locked batch at a time.
+
+    Rows are claimed with FOR UPDATE SKIP LOCKED, so several workers running
+    this job at once never refresh the same user twice. A refresh token Spotify
+    rejects (``invalid_grant``) is dropped until the user's next login; other
+    failures are retried with exponential backoff.
+    """
+    batch_size = batch_size or int(os.getenv('TOKEN_REFRESH_BATCH_SIZE', 50))
+    # Keep the lead above TOKEN_CACHE_TTL so no worker caches a user past its token's expiry
+    lead = timedelta(seconds=lead_seconds or int(os.getenv('TOKEN_REFRESH_LEAD_SECONDS', 600)))
+    # Tokens that stay unrefreshed this long (e.g. revoked grants) are left for the next login
+    lookback = timedelta(seconds=int(os.getenv('TOKEN_REFRESH_LOOKBACK_SECONDS', 24 * 3600)))
+    attempted = set()
+    refreshed = 0
+    while True:
+        now = datetime.now()
+        query = User.query.filter(User.refresh_token.isnot(None),
+                                  User.expires_at < now + lead,
+                                  User.expires_at > now - lookback,
+                                  or_(User.refresh_retry_at.is_(None), User.refresh_retry_at <= now))
+        if attempted:
+            query = query.filter(User.id.notin_(attempted))
+        users = query.order_by(User.expires_at).limit(batch_size).with_for_update(skip_locked=True).all()
+        if not users:
+            break
+        for user in users:
+            attempted.add(user.id)
+            try:
+                refresh_user_token(user)
+                refreshed += 1
+            except TokenRefreshError as e:
+                if e.error == 'invalid_grant':
+                    # Revoked or expired grant: no retry can succeed, so stop trying until the user logs in again
+                    logger.warning(f'Refresh token for user {user.id} rejected, dropping it: {e}')
+                    user.refresh_token = None
+                else:
+                    logger.warning(f'Token refresh for user {user.id} failed: {e}')
+                    _back_off(user)
+            except Exception as e:
+                logger.warning(f'Token refresh for user {user.id} failed: {e}')
+                _back_off(user)
+        db.session.commit()
+        if len(users) < batch_size:
+            break
+    return refreshed
+
+@spotify_auth_routes.route('/refresh_token', methods=['GET', 'POST'])
+@cross_origin(supports_credentials=True, origins='*')
+def refresh_token():
+    # Hands the client the user's current access token, refreshing it first if the scheduler hasn't yet.
+    authorization = request.headers.get('Authorization', '')
+    access_token = authorization.split(' ')[1] if ' ' in authorization else request.cookies.get('accessToken')
+    if not access_token:
+        return jsonify({"error": "Access token not provided"}), 400
+    user = User.query.filter(or_(User.access_token == access_token, User.previous_access_token == access_token)) \
+        .with_for_update().first()
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+    if not user.expires_at or user.expires_at <= datetime.now():
+        try:
+            refresh_user_token(user)
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f'Token refresh for user {user.id} failed: {e}')
+            return jsonify({"error": "Failed to refresh access token"}), 401
+    db.session.commit()
+    return prepare_response(user.access_token)
+
 def fetch_user_id(access_token):
     headers = {'Authorization': f'Bearer {access_token}'}
-    response = requests.get(API_BASE_URL + 'me', headers=headers)
+    response = http_client.get(API_BASE_URL + 'me', headers=headers)
     return response.json().get('id')
 
 def update_or_create_user(user_id, token_info):
+    """Store the tokens from a login in one INSERT ... ON CONFLICT round trip and return the user's json().
+
+    The user is cached under the new token, so the client's first request after
+    login skips the token lookup. As with a refresh, the replaced token is kept
+    as ``previous_access_token`` until the next rotation.
+    """
     expires_at = datetime.now() + timedelta(seconds=token_info['expires_in'])
+    insert = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}.get(db.session.get_bind().dialect.name)
+    if insert is None:
+        row = _update_or_create_user_orm(user_id, token_info, expires_at)
+    else:
+        row = _upsert_user(insert, user_id, token_info, expires_at)
+
+    if row.previous_access_token:
+        _token_cache.delete(row.previous_access_token)
+    user_json = {'id': row.id, 'access_token': token_info['access_token'],
+                 'refresh_token': row.refresh_token, 'user_id': user_id}
+    _token_cache.set(token_info['access_token'], user_json, ttl=min(_token_cache.ttl, token_info['expires_in']))
+    return user_json
+
+def _upsert_user(insert, user_id, token_info, expires_at):
+    statement = insert(User).values(user_id=user_id, access_token=token_info['access_token'],
+                                    refresh_token=token_info.get('refresh_token'), expires_at=expires_at)
+    statement = statement.on_conflict_do_update(index_elements=[User.user_id], set_={
+        'previous_access_token': User.access_token,
+        'access_token': statement.excluded.access_token,
+        # Some flows might not return a new refresh token
+        'refresh_token': func.coalesce(statement.excluded.refresh_token, User.refresh_token),
+        'expires_at': statement.excluded.expires_at,
+        'refresh_failures': 0,
+        'refresh_retry_at': None,
+    }).returning(User.id, User.refresh_token, User.previous_access_token)
+    row = db.session.execute(statement).one()
+    db.session.commit()
+    return row
+
+def _update_or_create_user_orm(user_id, token_info, expires_at):
+    # Returns the User, which has the same id/refresh_token/previous_access_token fields as the upsert's row
     user = User.query.filter_by(user_id=user_id).first()
     if user:
+        user.previous_access_token = user.access_token
         user.access_token = token_info['access_token']
-        user.refresh_token = token_info.get('refresh_token')  # Some flows might not return a new refresh token
+        user.refresh_token = token_info.get('refresh_token') or user.refresh_token
         user.expires_at = expires_at
+        user.refresh_failures = 0
+        user.refresh_retry_at = None
     else:
-        user = User(
-            user_id=user_id,
-            access_token=token_info['access_token'],
-            refresh_token=token_info['refresh_token'],
-            expires_at=expires_at
-        )
+        user = User(user_id=user_id, access_token=token_info['access_token'],
+                    refresh_token=token_info.get('refresh_token'), expires_at=expires_at)
         db.session.add(user)
     db.session.commit()
     return user
 
 def prepare_response(access_token):
-    print("inside prepare_response")
-    print("access_token: ", access_token)
     response = make_response(jsonify({"message": "Authentication successful", "access_token": access_token}))
     response.set_cookie('accessToken', value=access_token, secure=False, httponly=False, samesite='Lax')  
     return response
 
+# Helper function to read the access token from an "Authorization: Bearer <token>" header
+def bearer_token():
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        return None
+    return token.strip()
+
 # Helper function to get the user from the access token
 def get_user_from_token(access_token):
     if access_token:
+        cached_user = _token_cache.get(access_token)
+        if cached_user is not MISSING:
+            return cached_user
         # Use the helper function to query the user by access token
-        user = User.query.filter_by(access_token=access_token).one()
-        expires_at_datetime = datetime.strptime(user.expires_at, '%Y-%m-%d %H:%M:%S.%f')
-        if user and datetime.now().timestamp() < expires_at_datetime.timestamp():
-            return user.json()
-        else:
-            # Redirect to token refresh if the token has expired or no user is found
+        user = User.query.filter(or_(User.access_token == access_token,
+                                     User.previous_access_token == access_token)).first()
+        user_json = user.json() if user else None
+        # End the read now: callers go on to make slow upstream calls, and an open
+        # transaction would keep this connection checked out of the pool throughout
+        db.session.close()
+        now = datetime.now()
+        if user and user.expires_at and now < user.expires_at:
+            _token_cache.set(access_token, user_json, ttl=min(_token_cache.ttl, (user.expires_at - now).total_seconds()))
+            return user_json
+        elif user:
+            # Redirect to token refresh if the token has expired
             return redirect(url_for('spotify_auth_routes.refresh_token'))
         
@@ -1,102 +1,390 @@
-from flask import Blueprint, request, jsonify
-import requests
+from flask import Blueprint, Response, request, jsonify, stream_with_context, url_for
+import json
 import os
 import logging
-from app.routes.spotify import create_playlist, add_tracks_to_playlist
-from app.routes.spotify_auth import get_user_from_token
+from functools import partial
+from urllib.parse import urlparse
+from requests import HTTPError
+from app.routes.spotify_auth import bearer_token, get_user_from_token
+from app.services import http_client
+from app.services import charts
+from app.services import jobs
+from app.services import metrics
+from app.services.jobs import JobError
+from app.services.charts import chart_key, get_country_feature_matrix
+from app.services.geocode import cached_geocode, normalize_city
+from app.services import geocode as geocode_cache
+from app.services import weather_cache
+from app.services import weather_profiles
+from app.services.weather_cache import cached_weather, snap_to_grid
+from app.services import ratelimit
+from app.services.ratelimit import RateLimited
+from app.services.pipeline import Stage, StageError, default_stage_timeout, run_each, run_pipeline
+from app.services.scoring import rank_tracks, rank_tracks_many
+from app.services.playlists import write_playlist
+from app.services.singleflight import SingleFlight
+from app.services.spotify import SpotifyError
+from app.services.upstreams import LOCATIONIQ_BASE_URL, OPENWEATHER_BASE_URL
 from flask_cors import cross_origin
 
 weather_routes = Blueprint('weather_routes', __name__)
+logger = logging.getLogger(__name__)
 
-def filter_songs_by_weather(song_qualities, weather_condition, temperature):
-    print("Inside filter_songs_by_weather")
-
-    temperature = float(temperature)
-
-    if temperature > 30:
-        filtered_songs = [song for song in song_qualities if song['energy'] > 0.7 and song['valence'] > 0.7]
-    elif temperature < 10:
-        filtered_songs = [song for song in song_qualities if song['energy'] < 0.3 and song['valence'] < 0.3]
-    elif weather_condition in ['Rain', 'Snow']:
-        filtered_songs = [song for song in song_qualities if song['acousticness'] > 0.5]
-    elif weather_condition == 'Clear':
-        filtered_songs = [song for song in song_qualities if song['danceability'] > 0.7]
-    else:
-        filtered_songs = [song for song in song_qualities if 0.3 <= song['energy'] <= 0.7 and 0.3 <= song['valence'] <= 0.7]
-
-    songs_to_use = filtered_songs if len(filtered_songs) >= 10 else song_qualities[:10]
-    
-    track_uris = [song['uri'] for song in songs_to_use]
-    print("track_uris in filter song by weather", track_uris)  
+def filter_songs_by_weather(song_qualities, weather_condition, temperature, humidity=None, wind_speed=None):
+    with metrics.span('scoring'):
+        track_uris = rank_tracks(song_qualities, weather_condition, temperature, humidity, wind_speed,
+                                 k=int(os.getenv('PLAYLIST_TRACK_COUNT', 20)))
+    logger.debug('Selected tracks', extra={'fields': {'track_count': len(track_uris)}})
     return track_uris
     
 def get_api_key(api_name):
     return os.getenv(f'{api_name}_API_KEY')
 
 def call_api(url):
-    response = requests.get(url)
+    response = http_client.get(url)
+    if response.status_code == 429:
+        retry_after = response.headers.get('Retry-After')
+        host = urlparse(url).hostname
+        raise RateLimited(ratelimit.provider_for(host) or host,
+                          float(retry_after) if retry_after and retry_after.isdigit() else 1.0)
     response.raise_for_status()
     return response.json()
 
-def get_location_data(city):
+def fetch_location_data(city):
     api_key = get_api_key('LOCATIONIQ')
-    url = f"https://us1.locationiq.com/v1/search.php?key={api_key}&q={city}&format=json"
+    url = f"{LOCATIONIQ_BASE_URL}/search.php?key={api_key}&q={city}&format=json"
     return call_api(url)
 
+def get_location_data(city):
+    # An unknown city is the caller's mistake: LocationIQ answers 404 or an empty list
+    with metrics.span('geocode'):
+        try:
+            location = cached_geocode(city, fetch_location_data)
+        except HTTPError as e:
+            if e.response is None or e.response.status_code != 404:
+                raise
+            location = None
+    if not location:
+        raise StageError('location', 'Location not found', 404)
+    return location
+
 def get_weather_data(lat, lon):
+    with metrics.span('weather'):
+        return cached_weather(lat, lon, fetch_weather_data)
+
+def fetch_weather_data(lat, lon):
     api_key = get_api_key('OPENWEATHER')
-    url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={api_key}&units=metric"
+    url = f"{OPENWEATHER_BASE_URL}/weather?lat={lat}&lon={lon}&appid={api_key}&units=metric"
     return call_api(url)
 
 def get_spotify_data(country, access_token):
-    params = {'country': country}
-    headers = {'Authorization': f'Bearer {access_token}'}
-    url = "https://be-spotify-weather.onrender.com/search"
-    response = requests.get(url, params=params, headers=headers)
-    if response.status_code != 200:
-        raise Exception("Failed to fetch Spotify data")
-    return response.json()
+    # Same code path as GET /search, called in-process instead of looping back over HTTP.
+    # SpotifyError carries the upstream status code through to the pipeline's StageError.
+    return get_country_feature_matrix(country, access_token)
+
+def get_chart_unless_precomputed(country, access_token):
+    # None tells select_tracks to read the precomputed selection instead
+    if weather_profiles.available(country):
+        return None
+    return get_spotify_data(country, access_token)
+
+def weather_inputs(weather_data):
+    # (condition, temperature, humidity, wind speed), as the scorers take them
+    return (weather_data['weather'][0]['main'], weather_data['main']['temp'],
+            weather_data['main'].get('humidity'), weather_data.get('wind', {}).get('speed'))
+
+def select_tracks(country, songs, weather_data, access_token):
+    weather = weather_inputs(weather_data)
+    if songs is None:
+        with metrics.span('profile_lookup'):
+            track_uris = weather_profiles.lookup(country, *weather)
+        if track_uris is not None:
+            return track_uris
+        songs = get_spotify_data(country, access_token)
+    return filter_songs_by_weather(songs, *weather)
+
+def get_country_from_location(location_data):
+    return location_data[0]['display_name'].split(',')[-1].strip()
+
+# Identical stages of concurrent /weather requests (same normalized city and country)
+# share one in-flight execution; per-user steps like playlist writes are never shared.
+_stage_flights = {name: SingleFlight(name=f'stage_{name}') for name in ('location', 'weather', 'songs', 'track_uris')}
+
+def shared_stage(name, key, fn):
+    return _stage_flights[name].do(key, fn)
+
+# Stage functions: bound to the request with functools.partial, then called with the
+# results of the stages they require as keyword arguments.
+
+def location_stage(city_key, city):
+    return shared_stage('location', city_key, partial(get_location_data, city))
+
+def _flight_key(city_key, location):
+    return (city_key, get_country_from_location(location).casefold())
+
+def weather_stage(city_key, location):
+    return shared_stage('weather', _flight_key(city_key, location),
+                        partial(get_weather_data, location[0]['lat'], location[0]['lon']))
+
+def songs_stage(city_key, access_token, location):
+    return shared_stage('songs', _flight_key(city_key, location),
+                        partial(get_chart_unless_precomputed, get_country_from_location(location), access_token))
+
+def track_uris_stage(city_key, access_token, location, weather, songs):
+    return shared_stage('track_uris', _flight_key(city_key, location),
+                        partial(select_tracks, get_country_from_location(location), songs, weather, access_token))
+
+def run_weather_pipeline(city, access_token):
+    # geocode -> (weather || Spotify chart, unless precomputed) -> track selection
+    city_key = normalize_city(city)
+    stages = [
+        Stage('location', partial(location_stage, city_key, city)),
+        Stage('weather', partial(weather_stage, city_key), requires=['location']),
+        Stage('songs', partial(songs_stage, city_key, access_token), requires=['location']),
+        Stage('track_uris', partial(track_uris_stage, city_key, access_token), requires=['location', 'weather', 'songs']),
+    ]
+    results = run_pipeline(stages)
+    return make_selection(city, results['weather'], results['track_uris'])
+
+def make_selection(city, weather_data, track_uris):
+    return {
+        'playlist_name': f"{city} {weather_data['weather'][0]['description'].title()}",
+        'temperature': weather_data['main']['temp'],
+        'track_uris': track_uris,
+    }
+
+def select_country_batch(country, songs, weathers, access_token):
+    """Track URIs for each of ``weathers`` (weather_inputs tuples) in one country, scored in one pass."""
+    track_lists = [None] * len(weathers)
+    if songs is None:
+        with metrics.span('profile_lookup'):
+            track_lists = [weather_profiles.lookup(country, *weather) for weather in weathers]
+        if all(track_uris is not None for track_uris in track_lists):
+            return track_lists
+        songs = get_spotify_data(country, access_token)
+    missing = [i for i, track_uris in enumerate(track_lists) if track_uris is None]
+    with metrics.span('scoring'):
+        ranked = rank_tracks_many(songs, [weathers[i] for i in missing], k=int(os.getenv('PLAYLIST_TRACK_COUNT', 20)))
+    for i, track_uris in zip(missing, ranked):
+        track_lists[i] = track_uris
+    return track_lists
+
+def batch_stage(name, fn):
+    # A batch makes many calls to each provider at once: queue them to the rate-limit
+    # budget instead of shedding all but the burst
+    return Stage(name, partial(_paced, fn))
 
-def create_and_populate_playlist(playlist_name, track_uris,  access_token):
-    print("inside create_and_populate_playlist")
-    print("track_uris", track_uris)
-    playlist_info = create_playlist(access_token, playlist_name)
-    playlist_id = playlist_info['playlist_id']
-    print("inside create and populate, playlist_id: ", playlist_id)
-    print('back to popoulate playlist: track uris:', track_uris)
-    add_tracks_to_playlist(playlist_id, track_uris, access_token)
-    return playlist_id
+def batch_max_wait():
+    return float(os.getenv('WEATHER_BATCH_MAX_WAIT', 10))
+
+def _paced(fn):
+    with ratelimit.patience(batch_max_wait()):
+        return fn()
+
+def run_weather_batch(names, access_token):
+    """Select tracks for several cities, yielding ``(city_key, selection or StageError)`` as each is known.
+
+    ``names`` maps city_key -> city. Geocoding runs once per distinct city,
+    weather once per grid cell and the chart once per country, all
+    concurrently; each country's cities are then scored together. Upstream
+    calls queue up to WEATHER_BATCH_MAX_WAIT seconds (default 10) for a
+    rate-limit token rather than being shed.
+    """
+    timeout = default_stage_timeout() + batch_max_wait()
+    locations = {}
+    stages = {key: batch_stage('location', partial(location_stage, key, city)) for key, city in names.items()}
+    for key, location in run_each(stages, timeout=timeout):
+        if isinstance(location, StageError):
+            yield key, location
+        else:
+            locations[key] = location
+
+    cells = {key: snap_to_grid(location[0]['lat'], location[0]['lon']) for key, location in locations.items()}
+    countries = {key: get_country_from_location(location) for key, location in locations.items()}
+    by_country = {}
+    for key, country in countries.items():
+        by_country.setdefault(chart_key(country), []).append(key)
+
+    stages, dependents = {}, {}
+    for key, cell in cells.items():
+        stages.setdefault(('weather', cell), batch_stage('weather', partial(get_weather_data, *cell)))
+        dependents.setdefault(('weather', cell), []).append(key)
+    for country_id, keys in by_country.items():
+        stages[('songs', country_id)] = batch_stage('songs', partial(get_chart_unless_precomputed,
+                                                                     countries[keys[0]], access_token))
+        dependents[('songs', country_id)] = keys
+    upstream, failed = {}, set()
+    for stage_key, result in run_each(stages, timeout=timeout):
+        upstream[stage_key] = result
+        if isinstance(result, StageError):
+            for key in dependents[stage_key]:
+                if key not in failed:
+                    failed.add(key)
+                    yield key, result
+
+    scoring = {}
+    for country_id, keys in by_country.items():
+        ready = [key for key in keys if key not in failed]
+        if ready:
+            weathers = [weather_inputs(upstream[('weather', cells[key])]) for key in ready]
+            scoring[country_id] = batch_stage('track_uris', partial(select_country_batch, countries[ready[0]],
+                                                                    upstream[('songs', country_id)], weathers,
+                                                                    access_token))
+            by_country[country_id] = ready
+    for country_id, track_lists in run_each(scoring, timeout=timeout):
+        for i, key in enumerate(by_country[country_id]):
+            if isinstance(track_lists, StageError):
+                yield key, track_lists
+            else:
+                yield key, make_selection(names[key], upstream[('weather', cells[key])], track_lists[i])
+
+def create_and_populate_playlist(playlist_name, track_uris, access_token, user_id=None, reuse_existing=False):
+    if user_id is None:
+        user_id = get_user_from_token(access_token)['user_id']
+    report = write_playlist(user_id, playlist_name, track_uris, access_token, reuse_existing=reuse_existing)
+    logger.info('Wrote playlist', extra={'fields': {k: report[k] for k in ('playlist_id', 'added', 'failed', 'reused')}})
+    return report
+
+def generate_weather_playlist(city, user, reuse_existing=False):
+    # The presented token may be the one replaced by a background refresh
+    access_token = user['access_token']
+    selection = run_weather_pipeline(city, access_token)
+
+    report = create_and_populate_playlist(selection['playlist_name'], selection['track_uris'], access_token,
+                                          user_id=user['user_id'], reuse_existing=reuse_existing)
+    return playlist_result(selection, report)
+
+def playlist_result(selection, report):
+    return {
+        'temperature': selection['temperature'],
+        'playlist': report['playlist_id'],
+        'tracks_added': report['added'],
+        'tracks_failed': report['failed'],
+        'playlist_reused': report['reused'],
+    }
+
+def run_weather_job(payload, user):
+    try:
+        return generate_weather_playlist(payload['city'], user, payload.get('reuse_playlist', False))
+    except StageError as e:
+        raise JobError(e.to_dict()) from e
+    except (SpotifyError, RateLimited) as e:
+        raise JobError({'error': e.message, 'stage': 'playlist'}) from e
+
+jobs.register_handler('weather', run_weather_job)
+
+def authenticated_user():
+    """The requesting user's json(), or a ready-made error response."""
+    access_token = bearer_token()
+    if not access_token:
+        return None, (jsonify({'error': 'Missing or malformed Authorization header'}), 401)
+    with metrics.span('token_lookup'):
+        user = get_user_from_token(access_token)
+    if not user:
+        return None, (jsonify({'error': 'Access token not found'}), 400)
+    if not isinstance(user, dict):
+        # Expired token: hand back the redirect to /refresh_token
+        return None, user
+    return user, None
 
 @weather_routes.route('/weather', methods=['POST'])
 @cross_origin(supports_credentials=True, origins='*')  
 def get_weather():
-    print("inside get_weather")
     try:
         city = request.json.get('city')
-        print("city", city)
         if not city:
             return jsonify({'error': 'Invalid or missing city parameter'}), 400
-        access_token = request.headers.get('Authorization').split(' ')[1]
-        print("access_token", access_token)
-        user = get_user_from_token(access_token)
-        print("user", user)
-        if not user:
-            return jsonify({'error': 'Access token not found'}), 400
-
-        location_data = get_location_data(city)
-        weather_data = get_weather_data(location_data[0]['lat'], location_data[0]['lon'])
-        playlist_name = f"{city} {weather_data['weather'][0]['description'].title()}"
+        user, error_response = authenticated_user()
+        if error_response:
+            return error_response
 
-       
-        spotify_song_data = get_spotify_data(location_data[0]['display_name'].split(',')[-1].strip(), access_token)
-        temperature = weather_data['main']['temp']
-        weather_condition = weather_data['weather'][0]['main']
-        track_uris = filter_songs_by_weather(spotify_song_data, weather_condition, temperature)
-        print("track_uris saved from filter songs by weather before passed to create and populate playlist", track_uris)
+        reuse_existing = bool(request.json.get('reuse_playlist', os.getenv('PLAYLIST_REUSE_EXISTING', 'false').lower() == 'true'))
+        if request.json.get('async') or request.args.get('mode') == 'job':
+            # Return straight away; the pipeline runs on the job worker pool and is polled via GET /weather/jobs/<id>
+            job_id = jobs.enqueue('weather', user['id'], {'city': city, 'reuse_playlist': reuse_existing})
+            return jsonify({'job_id': job_id, 'status': jobs.QUEUED,
+                            'status_url': url_for('weather_routes.get_weather_job', job_id=job_id)}), 202
 
-        playlist_id = create_and_populate_playlist(playlist_name, track_uris, access_token)
+        return jsonify(generate_weather_playlist(city, user, reuse_existing))
+    except StageError as e:
+        logger.error(f"Weather pipeline failed: {e}", extra={'fields': e.to_dict()})
+        headers = {'Retry-After': str(max(1, round(e.retry_after)))} if e.retry_after else {}
+        return jsonify(e.to_dict()), e.status_code, headers
+    except SpotifyError as e:
+        logger.error(f"Playlist write failed: {e.message}")
+        return jsonify({'error': e.message, 'stage': 'playlist'}), e.status_code
+    except RateLimited as e:
+        logger.warning(f"Playlist write shed: {e}")
+        return jsonify({'error': e.message, 'stage': 'playlist'}), e.status_code, {'Retry-After': str(max(1, round(e.retry_after)))}
+    except Exception as e:
+        logger.exception(f"Internal server error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
 
-        return jsonify({'temperature': weather_data['main']['temp'], 'playlist': playlist_id})
+def stream_weather_batch(cities, user, reuse_existing=False):
+    """Yield an NDJSON line per distinct city: failures as soon as they are known, playlists as they are written."""
+    access_token = user['access_token']
+    names = {}
+    for city in cities:
+        names.setdefault(normalize_city(city), city)
+    selections, writes = {}, {}
+    try:
+        for key, selection in run_weather_batch(names, access_token):
+            if isinstance(selection, StageError):
+                logger.error(f"Weather pipeline failed for {names[key]}: {selection}", extra={'fields': selection.to_dict()})
+                yield json.dumps({'city': names[key], **selection.to_dict(), 'status': selection.status_code}) + '\n'
+            else:
+                selections[key] = selection
+                writes[key] = batch_stage('playlist', partial(create_and_populate_playlist, selection['playlist_name'],
+                                                              selection['track_uris'], access_token,
+                                                              user_id=user['user_id'], reuse_existing=reuse_existing))
     except Exception as e:
-        logging.error(f"Internal server error: {e}")
-        return jsonify({'error': 'Internal server error'}), 500
\ No newline at end of file
+        logger.exception(f"Internal server error: {e}")
+        yield json.dumps({'error': 'Internal server error'}) + '\n'
+        return
+
+    for key, report in run_each(writes, timeout=float(os.getenv('WEATHER_BATCH_WRITE_TIMEOUT', 60))):
+        if isinstance(report, StageError):
+            logger.error(f"Playlist write failed for {names[key]}: {report}")
+            line = {'city': names[key], **report.to_dict(), 'status': report.status_code}
+        else:
+            line = {'city': names[key], **playlist_result(selections[key], report)}
+        yield json.dumps(line) + '\n'
+
+@weather_routes.route('/weather/batch', methods=['POST'])
+@cross_origin(supports_credentials=True, origins='*')
+def get_weather_batch():
+    body = request.get_json(silent=True) or {}
+    cities = body.get('cities')
+    if not isinstance(cities, list) or not cities or not all(isinstance(city, str) and city.strip() for city in cities):
+        return jsonify({'error': 'Invalid or missing cities parameter'}), 400
+    max_cities = int(os.getenv('WEATHER_BATCH_MAX_CITIES', 10))
+    if len(cities) > max_cities:
+        return jsonify({'error': f'At most {max_cities} cities per request'}), 400
+    user, error_response = authenticated_user()
+    if error_response:
+        return error_response
+
+    reuse_existing = bool(body.get('reuse_playlist', os.getenv('PLAYLIST_REUSE_EXISTING', 'false').lower() == 'true'))
+    return Response(stream_with_context(stream_weather_batch(cities, user, reuse_existing)),
+                    mimetype='application/x-ndjson')
+
+@weather_routes.route('/weather/jobs/<job_id>', methods=['GET'])
+@cross_origin(supports_credentials=True, origins='*')
+def get_weather_job(job_id):
+    user, error_response = authenticated_user()
+    if error_response:
+        return error_response
+    job = jobs.get_job(job_id)
+    if not job or job.user_id != user['id']:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.json())
+
+@weather_routes.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify({
+        'geocode': geocode_cache.stats(),
+        'weather': weather_cache.stats(),
+        'charts': charts.stats(),
+        'weather_profiles': weather_profiles.stats(),
+        'coalesced_stages': {name: flight.stats() for name, flight in _stage_flights.items()},
+    })
@@ -0,0 +1,63 @@
+import threading
+import time
+from collections import OrderedDict
+
+from app.services import metrics
+
+MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe in-process LRU cache whose entries also expire after a TTL."""
+
+    def __init__(self, maxsize=1024, ttl=300, name=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        hit = False
+        value = default
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    self._data.move_to_end(key)
+                    hit, value = True, entry[0]
+                else:
+                    del self._data[key]
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if self.name:
+            metrics.inc('weatherbeats_cache_requests_total', {'cache': self.name, 'result': 'hit' if hit else 'miss'})
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,67 @@
+"""Build a country's candidate track pool from several playlists.
+
+Searches run concurrently, every matching playlist's pages are followed, and
+track IDs are deduplicated (first playlist wins) and capped before their audio
+features are read through the feature store.
+
+    CANDIDATE_QUERIES               comma-separated search templates, ``{country}``
+                                    is substituted (default "top 50 {country},viral 50 {country}")
+    CANDIDATE_PLAYLISTS_PER_QUERY   playlists taken from each search (default 3)
+    CANDIDATE_POOL_SIZE             maximum tracks in the pool (default 500)
+"""
+import logging
+import os
+
+from app.services import metrics
+from app.services.features import get_track_features
+from app.services.pipeline import fan_out
+from app.services.scoring import FeatureMatrix
+from app.services.spotify import SpotifyError, fetch_playlist_track_ids, search_playlists
+
+
+def candidate_queries(country):
+    templates = os.getenv('CANDIDATE_QUERIES', 'top 50 {country},viral 50 {country}')
+    return [template.strip().format(country=country) for template in templates.split(',') if template.strip()]
+
+
+def _search(query, access_token, limit):
+    try:
+        with metrics.span('chart_search'):
+            return search_playlists(query, access_token, limit=limit)
+    except SpotifyError as e:
+        logging.warning(f'Candidate search {query!r} failed: {e.message}')
+        return []
+
+
+def _tracks(playlist_id, access_token, max_tracks):
+    try:
+        with metrics.span('tracks'):
+            return fetch_playlist_track_ids(playlist_id, access_token, max_tracks=max_tracks)
+    except SpotifyError as e:
+        logging.warning(f'Candidate playlist {playlist_id} failed: {e.message}')
+        return []
+
+
+def gather_candidates(country, access_token):
+    """Return ``{'playlist_ids', 'track_ids', 'audio_features', 'feature_columns'}`` for the country's deduplicated candidate pool.
+
+    ``feature_columns`` holds the same features column by column, for ``FeatureMatrix.from_columns``.
+    """
+    per_query = int(os.getenv('CANDIDATE_PLAYLISTS_PER_QUERY', 3))
+    pool_size = int(os.getenv('CANDIDATE_POOL_SIZE', 500))
+
+    searches = fan_out(lambda query: _search(query, access_token, per_query), candidate_queries(country))
+    playlist_ids = list(dict.fromkeys(playlist_id for found in searches for playlist_id in found))
+    if not playlist_ids:
+        raise SpotifyError('No playlist found', 404)
+
+    track_lists = fan_out(lambda playlist_id: _tracks(playlist_id, access_token, pool_size), playlist_ids)
+    track_ids = list(dict.fromkeys(track_id for tracks in track_lists for track_id in tracks))[:pool_size]
+    with metrics.span('features'):
+        audio_features = get_track_features(track_ids, access_token)
+    return {
+        'playlist_ids': playlist_ids,
+        'track_ids': track_ids,
+        'audio_features': audio_features,
+        'feature_columns': FeatureMatrix.from_features(audio_features).to_columns(),
+    }
@@ -0,0 +1,151 @@
+"""Shared cache of per-country candidate pools (Top 50 and related charts) and their audio features.
+
+Charts live in the ``country_chart`` table so every worker shares them and
+they survive restarts; a short in-process tier avoids a DB read per request.
+
+    CHART_FRESH_SECONDS     age under which a chart is served as-is (default 6h)
+    CHART_MAX_AGE_SECONDS   age under which a stale chart is still served while
+                            a background refresh runs (default 3 days)
+    CHART_LOCAL_TTL         seconds charts stay in the in-process tier (default 300)
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db, end_read
+from app.services import metrics
+from app.services.cache import MISSING, TTLCache
+from app.services.pipeline import get_executor
+from app.services.ratelimit import RateLimited
+from app.services.scoring import FeatureMatrix
+from app.services.singleflight import SingleFlight
+from app.services.candidates import gather_candidates
+from models.chart import CountryChart
+
+FRESH_FOR = timedelta(seconds=int(os.getenv('CHART_FRESH_SECONDS', 6 * 3600)))
+MAX_AGE = timedelta(seconds=int(os.getenv('CHART_MAX_AGE_SECONDS', 3 * 24 * 3600)))
+
+_local = TTLCache(maxsize=512, ttl=int(os.getenv('CHART_LOCAL_TTL', 300)), name='chart_local')
+_fetches = SingleFlight(name='chart')
+_refreshing = set()
+_refresh_lock = threading.Lock()
+_counters = {'fresh': 0, 'stale': 0, 'inline_fetches': 0, 'background_refreshes': 0}
+
+
+def chart_key(country):
+    return ' '.join(country.split()).casefold()
+
+
+def _load(key):
+    try:
+        row = db.session.get(CountryChart, key)
+    except SQLAlchemyError:
+        logging.exception('Country chart read failed')
+        db.session.rollback()
+        return None
+    entry = None if row is None else {'payload': row.payload, 'fetched_at': row.fetched_at}
+    # Stale or missing charts are fetched from Spotify next; don't hold the connection through it
+    end_read()
+    return entry
+
+
+def _store(key, payload):
+    entry = {'payload': payload, 'fetched_at': datetime.utcnow()}
+    try:
+        db.session.merge(CountryChart(country=key, payload=payload, fetched_at=entry['fetched_at']))
+        db.session.commit()
+    except SQLAlchemyError:
+        logging.exception('Country chart write failed')
+        db.session.rollback()
+    _local.set(key, entry)
+    return entry
+
+
+def _fetch_and_store(key, country, access_token):
+    return _store(key, gather_candidates(country, access_token))
+
+
+def _refresh_in_background(key, country, access_token):
+    # At most one refresh per country is queued or running per process.
+    with _refresh_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+    app = current_app._get_current_object()
+
+    def refresh():
+        try:
+            with app.app_context():
+                _fetch_and_store(key, country, access_token)
+        except Exception:
+            logging.exception(f'Background refresh of {key} chart failed')
+        finally:
+            with _refresh_lock:
+                _refreshing.discard(key)
+
+    _counters['background_refreshes'] += 1
+    get_executor().submit(refresh)
+
+
+def _get_entry(country, access_token):
+    key = chart_key(country)
+    entry = _local.get(key)
+    if entry is MISSING:
+        entry = _load(key)
+
+    if entry is not None:
+        age = datetime.utcnow() - entry['fetched_at']
+        if age < FRESH_FOR:
+            _counters['fresh'] += 1
+            metrics.inc('weatherbeats_cache_requests_total', {'cache': 'chart', 'result': 'fresh'})
+            _local.set(key, entry)
+            return entry
+        if age < MAX_AGE:
+            _counters['stale'] += 1
+            metrics.inc('weatherbeats_cache_requests_total', {'cache': 'chart', 'result': 'stale'})
+            _refresh_in_background(key, country, access_token)
+            return entry
+
+    _counters['inline_fetches'] += 1
+    metrics.inc('weatherbeats_cache_requests_total', {'cache': 'chart', 'result': 'miss'})
+    try:
+        return _fetches.do(key, lambda: _fetch_and_store(key, country, access_token))
+    except RateLimited:
+        if entry is None:
+            raise
+        # Out of Spotify budget: serve the chart we have, however old
+        metrics.inc('weatherbeats_degraded_total', {'provider': 'spotify'})
+        return entry
+
+
+def get_country_chart(country, access_token):
+    """Return ``{'playlist_ids', 'track_ids', 'audio_features'}`` for ``country``, hitting Spotify only when no usable copy exists."""
+    return _get_entry(country, access_token)['payload']
+
+
+def get_country_song_qualities(country, access_token):
+    return get_country_chart(country, access_token)['audio_features']
+
+
+def feature_matrix(payload):
+    # Charts stored before feature_columns existed only have the per-track dicts
+    if 'feature_columns' in payload:
+        return FeatureMatrix.from_columns(payload['feature_columns'])
+    return FeatureMatrix.from_features(payload['audio_features'])
+
+
+def get_country_feature_matrix(country, access_token):
+    # Built once per cached entry, so scoring a hot country skips the list -> array conversion.
+    entry = _get_entry(country, access_token)
+    matrix = entry.get('matrix')
+    if matrix is None:
+        matrix = entry['matrix'] = feature_matrix(entry['payload'])
+    return matrix
+
+
+def stats():
+    return dict(_counters, local_size=len(_local))
@@ -0,0 +1,111 @@
+"""Short-lived key/value storage for PKCE code verifiers.
+
+``EPHEMERAL_BACKEND`` picks the implementation:
+
+    db     rows in ``temporary_storage`` (works across hosts; default)
+    file   one file per key under ``EPHEMERAL_DIR`` (default /dev/shm/weatherbeats,
+           i.e. shared memory). Every gunicorn worker on the host sees it and no
+           database commit sits on the login path, but it only works when the
+           /login and /callback requests land on the same host.
+"""
+import hashlib
+import os
+import tempfile
+import time
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+
+from models.temp import TemporaryStorage
+
+
+class EphemeralStore(ABC):
+    @abstractmethod
+    def set(self, key, value, ttl):
+        """Store ``value`` under ``key`` for ``ttl`` seconds."""
+
+    @abstractmethod
+    def pop(self, key):
+        """Return and remove the value for ``key``, or None if it is missing or expired."""
+
+    @abstractmethod
+    def cleanup(self):
+        """Drop expired entries and return how many were removed."""
+
+
+class DatabaseStore(EphemeralStore):
+    def set(self, key, value, ttl):
+        TemporaryStorage.put(key, value, datetime.utcnow() + timedelta(seconds=ttl))
+
+    def pop(self, key):
+        return TemporaryStorage.pop(key)
+
+    def cleanup(self):
+        return TemporaryStorage.cleanup(int(os.getenv('TEMP_STORAGE_SWEEP_BATCH_SIZE', 1000)))
+
+
+class FileStore(EphemeralStore):
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+    def set(self, key, value, ttl):
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        with os.fdopen(fd, 'w') as f:
+            f.write(f'{time.time() + ttl}\n{value}')
+        os.replace(tmp_path, path)
+
+    def _read(self, path):
+        with open(path) as f:
+            expires_at, _, value = f.read().partition('\n')
+        return float(expires_at), value
+
+    def pop(self, key):
+        # Renaming claims the entry atomically, so two workers can never both consume it
+        claimed = f'{self._path(key)}.claimed-{uuid.uuid4().hex}'
+        try:
+            os.rename(self._path(key), claimed)
+        except FileNotFoundError:
+            return None
+        try:
+            expires_at, value = self._read(claimed)
+        finally:
+            os.unlink(claimed)
+        return value if expires_at >= time.time() else None
+
+    def cleanup(self):
+        removed = 0
+        now = time.time()
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.name.startswith('.tmp-') or '.claimed-' in entry.name:
+                    # Leftovers from a worker that died mid-write or mid-pop
+                    expired = entry.stat().st_mtime < now - 60
+                else:
+                    expired = self._read(entry.path)[0] < now
+                if expired:
+                    os.unlink(entry.path)
+                    removed += 1
+            except (FileNotFoundError, ValueError):
+                continue
+        return removed
+
+
+_store = None
+
+
+def get_ephemeral_store():
+    global _store
+    if _store is None:
+        backend = os.getenv('EPHEMERAL_BACKEND', 'db').lower()
+        if backend == 'file':
+            _store = FileStore(os.getenv('EPHEMERAL_DIR', '/dev/shm/weatherbeats'))
+        elif backend == 'db':
+            _store = DatabaseStore()
+        else:
+            raise ValueError(f'Unknown EPHEMERAL_BACKEND {backend!r}')
+    return _store
@@ -0,0 +1,80 @@
+"""Persistent store of per-track audio features.
+
+A track's audio features never change, so they are fetched from Spotify once
+and then read from the ``track_features`` table by primary key. Only IDs
+missing from the store are requested, in batches of ``FEATURES_BATCH_SIZE``
+(the audio-features endpoint's limit).
+"""
+import logging
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db, end_read
+from app.services.pipeline import fan_out
+from app.services.scoring import FEATURE_COLUMNS
+from app.services.spotify import fetch_audio_features
+from models.track_features import TrackFeatures
+
+FEATURES_BATCH_SIZE = 100
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _insert_ignoring_duplicates(rows):
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        statement = postgresql.insert(TrackFeatures).values(rows).on_conflict_do_nothing()
+    elif dialect == 'sqlite':
+        statement = sqlite.insert(TrackFeatures).values(rows).on_conflict_do_nothing()
+    else:
+        for row in rows:
+            db.session.merge(TrackFeatures(**row))
+        return
+    db.session.execute(statement)
+
+
+def _to_record(features):
+    return {'id': features['id'], 'uri': features['uri'], **{column: features.get(column) for column in FEATURE_COLUMNS}}
+
+
+def _store(records):
+    rows = [{'track_id': r['id'], **{k: v for k, v in r.items() if k != 'id'}} for r in records]
+    if not rows:
+        return
+    try:
+        _insert_ignoring_duplicates(rows)
+        db.session.commit()
+    except SQLAlchemyError:
+        logging.exception('Storing track features failed')
+        db.session.rollback()
+
+
+def load_stored_features(track_ids):
+    stored = {}
+    for batch in chunked(list(track_ids), 1000):
+        for row in TrackFeatures.query.filter(TrackFeatures.track_id.in_(batch)):
+            stored[row.track_id] = row.json()
+    return stored
+
+
+def fetch_missing_features(track_ids, access_token):
+    batches = fan_out(lambda batch: fetch_audio_features(batch, access_token),
+                      chunked(track_ids, FEATURES_BATCH_SIZE))
+    fetched = [_to_record(f) for batch in batches for f in batch]
+    _store(fetched)
+    return {record['id']: record for record in fetched}
+
+
+def get_track_features(track_ids, access_token):
+    """Audio features for ``track_ids`` in the order given; tracks Spotify has no features for are skipped."""
+    track_ids = list(dict.fromkeys(track_ids))
+    features = load_stored_features(track_ids)
+    missing = [track_id for track_id in track_ids if track_id not in features]
+    if missing:
+        end_read()
+        features.update(fetch_missing_features(missing, access_token))
+    return [features[track_id] for track_id in track_ids if track_id in features]
@@ -0,0 +1,95 @@
+"""Two-tier cache in front of LocationIQ geocoding.
+
+City strings are normalized before lookup, then checked against a per-process
+LRU and the shared ``geocode_cache`` table (visible to every gunicorn worker)
+before LocationIQ is called.
+
+    GEOCODE_CACHE_TTL    seconds a geocode stays valid (default 30 days)
+    GEOCODE_CACHE_SIZE   entries kept in the in-process tier (default 2048)
+"""
+import logging
+import os
+import re
+import threading
+import unicodedata
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db, end_read
+from app.services import metrics
+from app.services.cache import MISSING, TTLCache
+from models.geocode import GeocodeCache
+
+_local = TTLCache(maxsize=int(os.getenv('GEOCODE_CACHE_SIZE', 2048)), name='geocode_local',
+                  ttl=int(os.getenv('GEOCODE_CACHE_TTL', 30 * 24 * 3600)))
+_counter_lock = threading.Lock()
+_counters = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+
+
+def normalize_city(city):
+    city = unicodedata.normalize('NFKC', city).casefold()
+    city = re.sub(r'\s*,\s*', ', ', city)
+    city = re.sub(r'\s+', ' ', city)
+    return city.strip(' ,.;')
+
+
+def _count(name):
+    with _counter_lock:
+        _counters[name] += 1
+    if name != 'local_hits':
+        metrics.inc('weatherbeats_cache_requests_total',
+                    {'cache': 'geocode_shared', 'result': 'hit' if name == 'shared_hits' else 'miss'})
+
+
+def _read_shared(key):
+    try:
+        row = db.session.get(GeocodeCache, key)
+    except SQLAlchemyError:
+        logging.exception('Geocode cache read failed')
+        db.session.rollback()
+        return MISSING
+    # A miss is followed by a LocationIQ call; don't hold the connection through it
+    end_read()
+    if row is None or row.expires_at <= datetime.utcnow():
+        return MISSING
+    return row.data
+
+
+def _write_shared(key, data):
+    try:
+        db.session.merge(GeocodeCache(key=key, data=data,
+                                      expires_at=datetime.utcnow() + timedelta(seconds=_local.ttl)))
+        db.session.commit()
+    except SQLAlchemyError:
+        # Another worker stored the same city first; its row is just as good.
+        db.session.rollback()
+
+
+def cached_geocode(city, fetch):
+    """Return geocoding results for ``city``, calling ``fetch(normalized_city)`` only on a miss in both tiers."""
+    key = normalize_city(city)
+    data = _local.get(key)
+    if data is not MISSING:
+        _count('local_hits')
+        return data
+
+    data = _read_shared(key)
+    if data is not MISSING:
+        _count('shared_hits')
+        _local.set(key, data)
+        return data
+
+    _count('misses')
+    data = fetch(key)
+    if data:
+        _local.set(key, data)
+        _write_shared(key, data)
+    return data
+
+
+def stats():
+    with _counter_lock:
+        counters = dict(_counters)
+    counters['local_size'] = len(_local)
+    return counters
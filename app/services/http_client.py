@@ -0,0 +1,115 @@
+"""Per-process pooled HTTP client shared by every upstream integration.
+
+One ``requests.Session`` per process keeps TCP/TLS connections to LocationIQ,
+OpenWeather and Spotify alive between requests. Pool sizes, timeouts and
+retries are configured through environment variables:
+
+    HTTP_POOL_HOSTS        number of per-host pools kept (default 10)
+    HTTP_POOL_SIZE         connections kept per host (default 10)
+    HTTP_CONNECT_TIMEOUT   seconds (default 3.05)
+    HTTP_READ_TIMEOUT      seconds (default 10)
+    HTTP_MAX_RETRIES       retries for idempotent requests (default 3)
+    HTTP_BACKOFF_FACTOR    exponential backoff factor (default 0.3)
+    HTTP_MAX_RETRY_AFTER   upper bound in seconds on an honoured Retry-After (default 10)
+"""
+import os
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.services import metrics, ratelimit
+from app.services.pipeline import PerProcess
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, default))
+
+
+class CappedRetry(Retry):
+    """Honours Retry-After (Spotify sends it with 429s) but never sleeps longer than ``max_retry_after``."""
+
+    def __init__(self, *args, max_retry_after=10.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_retry_after = max_retry_after
+
+    def new(self, **kw):
+        new_retry = super().new(**kw)
+        new_retry.max_retry_after = self.max_retry_after
+        return new_retry
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, self.max_retry_after)
+
+
+def _build_session():
+    retries = CappedRetry(
+        total=_env_int('HTTP_MAX_RETRIES', 3),
+        backoff_factor=_env_float('HTTP_BACKOFF_FACTOR', 0.3),
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET', 'PUT', 'DELETE', 'HEAD', 'OPTIONS']),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+        max_retry_after=_env_float('HTTP_MAX_RETRY_AFTER', 10),
+    )
+    adapter = HTTPAdapter(
+        pool_connections=_env_int('HTTP_POOL_HOSTS', 10),
+        pool_maxsize=_env_int('HTTP_POOL_SIZE', 10),
+        max_retries=retries,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+_session = PerProcess(_build_session)
+
+
+def get_session():
+    # Per process, so a forked gunicorn worker never reuses its parent's sockets.
+    return _session.get()
+
+
+def default_timeout():
+    return (_env_float('HTTP_CONNECT_TIMEOUT', 3.05), _env_float('HTTP_READ_TIMEOUT', 10))
+
+
+def request(method, url, **kwargs):
+    kwargs.setdefault('timeout', default_timeout())
+    host = urlparse(url).hostname
+    provider = ratelimit.provider_for(host)
+    if provider:
+        ratelimit.acquire(provider)
+    start = time.perf_counter()
+    status = 'error'
+    try:
+        response = get_session().request(method, url, **kwargs)
+        status = str(response.status_code)
+        return response
+    finally:
+        metrics.observe('weatherbeats_upstream_seconds', time.perf_counter() - start, {'host': host})
+        metrics.inc('weatherbeats_upstream_responses_total', {'host': host, 'status': status})
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def put(url, **kwargs):
+    return request('PUT', url, **kwargs)
@@ -0,0 +1,124 @@
+"""Database-backed queue for long-running playlist generation.
+
+Jobs are rows in ``playlist_job``. Enqueueing commits the row and nudges this
+process's worker pool; workers claim queued rows with FOR UPDATE SKIP LOCKED,
+so any gunicorn worker (or the scheduler's periodic drain) can pick up any
+job exactly once.
+
+    JOB_WORKERS         threads running jobs in each process (default 4)
+    JOB_STALE_SECONDS   a job still "running" after this long is marked failed (default 600)
+"""
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import db
+from app.services.pipeline import PerProcess
+from models.job import PlaylistJob
+from models.user import User
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+
+_handlers = {}
+_executor = PerProcess(lambda: ThreadPoolExecutor(max_workers=int(os.getenv('JOB_WORKERS', 4)), thread_name_prefix='jobs'))
+
+
+class JobError(Exception):
+    """Raised by a handler to fail a job with a client-facing error body."""
+
+    def __init__(self, error):
+        super().__init__(error.get('error'))
+        self.error = error
+
+
+def register_handler(kind, fn):
+    """``fn(payload, user)`` runs the job and returns its JSON-serializable result; ``user`` is ``User.json()``."""
+    _handlers[kind] = fn
+
+
+def _get_executor():
+    return _executor.get()
+
+
+def enqueue(kind, user_id, payload):
+    job = PlaylistJob(id=uuid.uuid4().hex, kind=kind, user_id=user_id, status=QUEUED, payload=payload)
+    db.session.add(job)
+    db.session.commit()
+    app = current_app._get_current_object()
+    _get_executor().submit(_run_in_context, app)
+    return job.id
+
+
+def get_job(job_id):
+    return db.session.get(PlaylistJob, job_id)
+
+
+def _claim_next():
+    job = PlaylistJob.query.filter_by(status=QUEUED).order_by(PlaylistJob.created_at) \
+        .with_for_update(skip_locked=True).first()
+    if job is None:
+        db.session.rollback()
+        return None
+    job.status = RUNNING
+    job.updated_at = datetime.utcnow()
+    db.session.commit()
+    return job
+
+
+def _finish(job, status, result=None, error=None):
+    job.status = status
+    job.result = result
+    job.error = error
+    job.updated_at = datetime.utcnow()
+    db.session.commit()
+
+
+def run_next_job():
+    """Claim and run one queued job; returns False when the queue is empty."""
+    job = _claim_next()
+    if job is None:
+        return False
+    handler = _handlers.get(job.kind)
+    user = db.session.get(User, job.user_id)
+    try:
+        if handler is None:
+            raise JobError({'error': f'Unknown job kind {job.kind}'})
+        if user is None:
+            raise JobError({'error': 'User not found'})
+        _finish(job, SUCCEEDED, result=handler(job.payload, user.json()))
+    except JobError as e:
+        db.session.rollback()
+        _finish(job, FAILED, error=e.error)
+    except Exception:
+        logging.exception(f'Job {job.id} failed')
+        db.session.rollback()
+        _finish(job, FAILED, error={'error': 'Internal server error'})
+    return True
+
+
+def _run_in_context(app):
+    # Keep going while there is work, so one nudge also drains jobs other workers left queued
+    with app.app_context():
+        try:
+            while run_next_job():
+                pass
+        except Exception:
+            logging.exception('Running queued job failed')
+
+
+def dispatch_queued():
+    """Scheduler entry point: fail jobs stuck running, then hand queued jobs to the worker pool."""
+    stale_before = datetime.utcnow() - timedelta(seconds=int(os.getenv('JOB_STALE_SECONDS', 600)))
+    PlaylistJob.query.filter(PlaylistJob.status == RUNNING, PlaylistJob.updated_at < stale_before) \
+        .update({'status': FAILED, 'error': {'error': 'Job timed out'}, 'updated_at': datetime.utcnow()},
+                synchronize_session=False)
+    db.session.commit()
+    queued = PlaylistJob.query.filter_by(status=QUEUED).count()
+    app = current_app._get_current_object()
+    for _ in range(min(queued, int(os.getenv('JOB_WORKERS', 4)))):
+        _get_executor().submit(_run_in_context, app)
+    return queued
@@ -0,0 +1,209 @@
+"""Per-stage latency histograms and counters, exported in Prometheus text format.
+
+Each process records into an in-memory registry and periodically writes a
+snapshot to ``METRICS_DIR`` (one file per process). ``render()`` merges the
+snapshots of the current run, so a scrape of any gunicorn worker reports
+totals for the whole instance. A run is one gunicorn instance (its workers
+inherit the master's run ID) or one standalone process; snapshots left by
+runs whose process has exited are deleted.
+
+    METRICS_DIR              snapshot directory shared by the workers (default
+                             weatherbeats-metrics under /dev/shm, or the temp
+                             directory where there is no /dev/shm)
+    METRICS_FLUSH_INTERVAL   minimum seconds between snapshot writes (default 1)
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    'weatherbeats_stage_seconds': 'Time spent in each request stage.',
+    'weatherbeats_upstream_seconds': 'Latency of upstream HTTP calls by host.',
+    'weatherbeats_upstream_responses_total': 'Upstream HTTP responses by host and status code.',
+    'weatherbeats_cache_requests_total': 'Cache lookups by cache and result.',
+    'weatherbeats_coalesced_total': 'Calls that joined an identical in-flight call instead of running.',
+    'weatherbeats_rate_limited_total': 'Upstream calls shed by the rate-limit governor.',
+    'weatherbeats_degraded_total': 'Responses served from stale data because an upstream budget ran out.',
+}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_last_flush = 0.0
+_snapshot_name = None
+_warned_pid = None
+
+
+def _key(name, labels):
+    return json.dumps([name, sorted((labels or {}).items())])
+
+
+def inc(name, labels=None, value=1):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    _maybe_flush()
+
+
+def observe(name, seconds, labels=None):
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0}
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram['buckets'][i] += 1
+        histogram['sum'] += seconds
+        histogram['count'] += 1
+    _maybe_flush()
+
+
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('weatherbeats_stage_seconds', time.perf_counter() - start, {'stage': stage})
+
+
+def metrics_dir():
+    shared = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.getenv('METRICS_DIR', os.path.join(shared, 'weatherbeats-metrics'))
+
+
+def start_run():
+    """Begin a run owned by this process and drop snapshots of runs that have ended.
+
+    Called by the gunicorn master before forking; any other process starts
+    its own run on first use.
+    """
+    os.environ['METRICS_RUN_ID'] = f'{os.getpid()}.{time.time_ns()}'
+    try:
+        for entry in os.scandir(metrics_dir()):
+            if entry.name.endswith('.json') and not _run_alive(entry.name.split('-', 1)[0]):
+                os.unlink(entry.path)
+    except OSError:
+        pass
+    return os.environ['METRICS_RUN_ID']
+
+
+def _run_alive(run):
+    try:
+        os.kill(int(run.split('.', 1)[0]), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def run_id():
+    return os.getenv('METRICS_RUN_ID') or start_run()
+
+
+def _snapshot_path():
+    # pid plus start time: a recycled pid must not overwrite a dead worker's totals
+    global _snapshot_name
+    prefix = f'{run_id()}-{os.getpid()}-'
+    if _snapshot_name is None or not _snapshot_name.startswith(prefix):
+        _snapshot_name = f'{prefix}{time.time_ns()}.json'
+    return os.path.join(metrics_dir(), _snapshot_name)
+
+
+def _own():
+    with _lock:
+        return dict(_counters), {k: dict(v, buckets=list(v['buckets'])) for k, v in _histograms.items()}
+
+
+def flush():
+    """Write this process's snapshot; returns False if it couldn't be written."""
+    global _last_flush, _warned_pid
+    counters, histograms = _own()
+    snapshot = {'counters': counters, 'histograms': histograms}
+    _last_flush = time.monotonic()
+    try:
+        os.makedirs(metrics_dir(), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=metrics_dir(), prefix='.tmp-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, _snapshot_path())
+    except OSError:
+        if _warned_pid != os.getpid():
+            _warned_pid = os.getpid()
+            logging.exception(f'Metrics snapshot dir {metrics_dir()} unavailable; /metrics covers this process only')
+        return False
+    return True
+
+
+def _maybe_flush():
+    if time.monotonic() - _last_flush >= float(os.getenv('METRICS_FLUSH_INTERVAL', 1)):
+        flush()
+
+
+def _merged():
+    counters, histograms = {}, {}
+    try:
+        prefix = f'{run_id()}-'
+        paths = [entry.path for entry in os.scandir(metrics_dir())
+                 if entry.name.startswith(prefix) and entry.name.endswith('.json')]
+    except FileNotFoundError:
+        paths = []
+    for path in paths:
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for key, value in snapshot['counters'].items():
+            counters[key] = counters.get(key, 0) + value
+        for key, value in snapshot['histograms'].items():
+            merged = histograms.setdefault(key, {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0})
+            merged['buckets'] = [a + b for a, b in zip(merged['buckets'], value['buckets'])]
+            merged['sum'] += value['sum']
+            merged['count'] += value['count']
+    return counters, histograms
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def render():
+    # Without a shared snapshot dir, report this process rather than nothing
+    counters, histograms = _merged() if flush() else _own()
+    lines = []
+    seen = set()
+
+    def header(name, kind):
+        if name not in seen:
+            seen.add(name)
+            if name in HELP:
+                lines.append(f'# HELP {name} {HELP[name]}')
+            lines.append(f'# TYPE {name} {kind}')
+
+    for key in sorted(counters):
+        name, labels = json.loads(key)
+        header(name, 'counter')
+        lines.append(f'{name}{_format_labels(labels)} {counters[key]}')
+    for key in sorted(histograms):
+        name, labels = json.loads(key)
+        header(name, 'histogram')
+        histogram = histograms[key]
+        for bound, count in zip(BUCKETS, histogram['buckets']):
+            lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {count}')
+        lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {histogram["count"]}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {histogram["sum"]}')
+        lines.append(f'{name}_count{_format_labels(labels)} {histogram["count"]}')
+    return '\n'.join(lines) + '\n'
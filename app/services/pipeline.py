@@ -0,0 +1,183 @@
+"""Run a request's upstream calls as a small dependency graph.
+
+Each ``Stage`` names the stages it needs; stages whose inputs are ready run
+concurrently on a shared per-process thread pool, so the wall-clock time of a
+pipeline approaches its slowest branch instead of the sum of all calls.
+
+    PIPELINE_WORKERS         threads in the per-process pool (default 16)
+    PIPELINE_STAGE_TIMEOUT   default per-stage timeout in seconds (default 15)
+    FANOUT_WORKERS           threads for fan_out() (default 16)
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from flask import current_app, has_app_context
+
+
+
+class StageError(Exception):
+    def __init__(self, stage, message, status_code=502, retry_after=None):
+        super().__init__(f'{stage}: {message}')
+        self.stage = stage
+        self.message = message
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    def to_dict(self):
+        return {'error': self.message, 'stage': self.stage}
+
+
+class Stage:
+    def __init__(self, name, fn, requires=(), timeout=None):
+        self.name = name
+        self.fn = fn
+        self.requires = tuple(requires)
+        self.timeout = timeout
+
+
+def default_stage_timeout():
+    return float(os.getenv('PIPELINE_STAGE_TIMEOUT', 15))
+
+
+class PerProcess:
+    """A lazily built object, rebuilt after a fork.
+
+    Keyed on the pid so a forked gunicorn worker never uses its parent's
+    threads or sockets.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._value = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        pid = os.getpid()
+        if self._value is None or self._pid != pid:
+            with self._lock:
+                if self._value is None or self._pid != pid:
+                    self._value = self._factory()
+                    self._pid = pid
+        return self._value
+
+
+_executor = PerProcess(lambda: ThreadPoolExecutor(max_workers=int(os.getenv('PIPELINE_WORKERS', 16)),
+                                                  thread_name_prefix='pipeline'))
+# Separate from the stage pool so a stage waiting on its own fan-out can't starve it.
+_fanout_executor = PerProcess(lambda: ThreadPoolExecutor(max_workers=int(os.getenv('FANOUT_WORKERS', 16)),
+                                                         thread_name_prefix='fanout'))
+
+
+def get_executor():
+    return _executor.get()
+
+
+def get_fanout_executor():
+    return _fanout_executor.get()
+
+
+def fan_out(fn, items):
+    """Call ``fn`` on every item concurrently and return the results in input order.
+
+    Meant for independent upstream calls inside a stage; ``fn`` runs without an app context.
+    """
+    items = list(items)
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    return list(get_fanout_executor().map(fn, items))
+
+
+def _run_stage(app, stage, kwargs):
+    try:
+        if app is None:
+            return stage.fn(**kwargs)
+        with app.app_context():
+            return stage.fn(**kwargs)
+    except StageError:
+        raise
+    except Exception as e:
+        logging.exception(f'Pipeline stage {stage.name} failed')
+        message = getattr(e, 'message', None) or 'Upstream call failed'
+        raise StageError(stage.name, message, getattr(e, 'status_code', 502), getattr(e, 'retry_after', None)) from e
+
+
+def run_pipeline(stages, inputs=None):
+    """Run ``stages`` and return a dict of every stage's result keyed by stage name.
+
+    ``inputs`` seeds values stages can require by name. The first failing or
+    timed-out stage raises ``StageError``; stages still running are abandoned.
+    """
+    results = dict(inputs or {})
+    pending = {stage.name: stage for stage in stages}
+    for stage in stages:
+        missing = [dep for dep in stage.requires if dep not in pending and dep not in results]
+        if missing:
+            raise ValueError(f'stage {stage.name} requires unknown stage(s) {missing}')
+
+    app = current_app._get_current_object() if has_app_context() else None
+    executor = get_executor()
+    running = {}
+
+    while pending or running:
+        for name, stage in list(pending.items()):
+            if all(dep in results for dep in stage.requires):
+                kwargs = {dep: results[dep] for dep in stage.requires}
+                timeout = stage.timeout if stage.timeout is not None else default_stage_timeout()
+                future = executor.submit(_run_stage, app, stage, kwargs)
+                running[future] = (stage, time.monotonic() + timeout)
+                del pending[name]
+
+        if not running:
+            raise ValueError(f'stages {sorted(pending)} can never run (dependency cycle)')
+
+        next_deadline = min(deadline for _, deadline in running.values())
+        done, _ = wait(running, timeout=max(0.0, next_deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+
+        for future in done:
+            stage, _ = running.pop(future)
+            try:
+                results[stage.name] = future.result()
+            except StageError:
+                for other in running:
+                    other.cancel()
+                raise
+
+        now = time.monotonic()
+        for future, (stage, deadline) in running.items():
+            if now >= deadline:
+                for other in running:
+                    other.cancel()
+                raise StageError(stage.name, 'Upstream call timed out', 504)
+
+    return results
+
+
+def run_each(stages, timeout=None):
+    """Run independent stages concurrently, yielding ``(key, result)`` as each one finishes.
+
+    ``stages`` maps keys to Stages without requirements. A stage that fails, or
+    is still running after ``timeout`` seconds for the whole set, yields its
+    ``StageError`` as its result instead of failing the others.
+    """
+    app = current_app._get_current_object() if has_app_context() else None
+    executor = get_executor()
+    futures = {executor.submit(_run_stage, app, stage, {}): key for key, stage in stages.items()}
+    deadline = time.monotonic() + (timeout if timeout is not None else default_stage_timeout())
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        if not done:
+            for future in pending:
+                future.cancel()
+                key = futures[future]
+                yield key, StageError(stages[key].name, 'Upstream call timed out', 504)
+            return
+        for future in done:
+            try:
+                yield futures[future], future.result()
+            except StageError as e:
+                yield futures[future], e
@@ -0,0 +1,122 @@
+"""Write generated playlists to Spotify in chunks.
+
+Spotify accepts at most 100 URIs per add/replace call, so track lists are
+split into chunks. The first chunk is written on its own (it creates or
+replaces the contents); the rest are appended with up to
+``PLAYLIST_WRITE_PARALLELISM`` requests in flight (default 1, which keeps
+chunk order; higher values trade order for speed). Each chunk is retried on
+429/503, and the result reports which chunks failed instead of pretending the
+whole playlist was written.
+"""
+import logging
+import os
+import threading
+import time
+
+from requests import RequestException
+
+from app.services import http_client
+from app.services.pipeline import fan_out
+from app.services import metrics
+from app.services import spotify
+from app.services.ratelimit import RateLimited
+from app.services.spotify import SpotifyError, auth_headers
+
+PLAYLIST_CHUNK_SIZE = 100
+RETRYABLE_STATUSES = (429, 503)
+PLAYLIST_DESCRIPTION = 'Generated by WeatherBeats'
+
+
+def _send_with_retry(method, url, access_token, payload, attempts=3):
+    # http_client does not retry POSTs on its own; these are safe to repeat on 429/503
+    # because Spotify has not applied the request.
+    response = None
+    for attempt in range(attempts):
+        response = http_client.request(method, url, headers=auth_headers(access_token), json=payload)
+        if response.status_code not in RETRYABLE_STATUSES or attempt == attempts - 1:
+            break
+        retry_after = response.headers.get('Retry-After')
+        delay = float(retry_after) if retry_after and retry_after.isdigit() else 0.5 * 2 ** attempt
+        time.sleep(min(delay, float(os.getenv('HTTP_MAX_RETRY_AFTER', 10))))
+    return response
+
+
+def create_playlist(user_id, playlist_name, access_token):
+    with metrics.span('playlist_create'):
+        response = _send_with_retry('POST', f"{spotify.API_BASE_URL}users/{user_id}/playlists", access_token,
+                                    {'name': playlist_name, 'description': PLAYLIST_DESCRIPTION, 'public': True})
+    if response.status_code != 201:
+        raise SpotifyError('Failed to create playlist', response.status_code)
+    return response.json()['id']
+
+
+def find_user_playlist(user_id, playlist_name, access_token):
+    """ID of the user's own playlist called ``playlist_name``, or None."""
+    url = f"{spotify.API_BASE_URL}me/playlists"
+    params = {'limit': 50}
+    while url:
+        response = http_client.get(url, headers=auth_headers(access_token), params=params)
+        if response.status_code != 200:
+            raise SpotifyError('Failed to list playlists', response.status_code)
+        data = response.json()
+        for playlist in data['items']:
+            if playlist and playlist['name'] == playlist_name and playlist.get('owner', {}).get('id') == user_id:
+                return playlist['id']
+        url, params = data.get('next'), None
+    return None
+
+
+def chunks_with_offset(items, size=PLAYLIST_CHUNK_SIZE):
+    return [(start, items[start:start + size]) for start in range(0, len(items), size)]
+
+
+def add_tracks(playlist_id, track_uris, access_token, replace=False):
+    """Write ``track_uris`` to the playlist in chunks; returns ``{'added', 'failed', 'failed_chunks'}``."""
+    url = f"{spotify.API_BASE_URL}playlists/{playlist_id}/tracks"
+    chunks = chunks_with_offset(list(track_uris))
+    report = {'added': 0, 'failed': 0, 'failed_chunks': []}
+    lock = threading.Lock()
+
+    def fail(start, uris, status, reason):
+        logging.warning(f'Writing tracks {start}-{start + len(uris)} to playlist {playlist_id} failed: {reason}')
+        report['failed'] += len(uris)
+        report['failed_chunks'].append({'offset': start, 'count': len(uris), 'status': status})
+
+    def write(chunk, method='POST'):
+        start, uris = chunk
+        try:
+            with metrics.span('add_tracks'):
+                response = _send_with_retry(method, url, access_token, {'uris': uris})
+        except (RequestException, RateLimited) as e:
+            # A dropped connection or shed call loses this chunk only; the rest are still written
+            with lock:
+                fail(start, uris, getattr(e, 'status_code', None), repr(e))
+            return
+        with lock:
+            if response.status_code in (200, 201):
+                report['added'] += len(uris)
+            else:
+                fail(start, uris, response.status_code, response.status_code)
+
+    if replace:
+        # PUT replaces the playlist's contents with the first chunk (or empties it)
+        write(chunks[0] if chunks else (0, []), method='PUT')
+        chunks = chunks[1:]
+    elif chunks:
+        write(chunks[0])
+        chunks = chunks[1:]
+
+    parallelism = max(1, int(os.getenv('PLAYLIST_WRITE_PARALLELISM', 1)))
+    for start in range(0, len(chunks), parallelism):
+        fan_out(write, chunks[start:start + parallelism])
+    return report
+
+
+def write_playlist(user_id, playlist_name, track_uris, access_token, reuse_existing=False):
+    """Create (or, with ``reuse_existing``, overwrite the user's same-named) playlist and fill it."""
+    playlist_id = find_user_playlist(user_id, playlist_name, access_token) if reuse_existing else None
+    reused = playlist_id is not None
+    if not reused:
+        playlist_id = create_playlist(user_id, playlist_name, access_token)
+    report = add_tracks(playlist_id, track_uris, access_token, replace=reused)
+    return dict(report, playlist_id=playlist_id, playlist_name=playlist_name, reused=reused)
@@ -0,0 +1,143 @@
+"""Per-provider token buckets shared by every gunicorn worker on the host.
+
+Each provider's bucket is a small file under ``RATE_LIMIT_DIR`` (shared memory
+by default) updated under ``flock``, so all workers draw from one budget. A
+call that would overrun the budget waits up to ``RATE_LIMIT_MAX_WAIT`` seconds
+for a token and is otherwise shed with ``RateLimited`` before it reaches the
+provider; callers fall back to cached data where they have it.
+
+    RATE_LIMIT_<PROVIDER>   "rate,burst" in requests/second, e.g. RATE_LIMIT_LOCATIONIQ=2,2;
+                            "0" disables the bucket
+    RATE_LIMIT_DIR          bucket directory (default weatherbeats-ratelimit under /dev/shm,
+                            or the temp directory where there is no /dev/shm)
+    RATE_LIMIT_MAX_WAIT     seconds a call may queue for a token (default: time for two
+                            tokens to refill at the provider's rate, at least 0.25); work
+                            inside ``patience()`` may wait longer
+
+If the bucket directory can't be used, calls go through unthrottled: the
+governor must never be the reason an upstream call fails.
+"""
+import contextvars
+import fcntl
+import logging
+import os
+import struct
+import tempfile
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from app.services import metrics, upstreams
+
+DEFAULT_LIMITS = {
+    'locationiq': '2,2',
+    'openweather': '1,10',
+    'spotify': '10,20',
+}
+PROVIDER_HOSTS = {
+    urlparse(upstreams.LOCATIONIQ_BASE_URL).hostname: 'locationiq',
+    urlparse(upstreams.OPENWEATHER_BASE_URL).hostname: 'openweather',
+    urlparse(upstreams.SPOTIFY_API_BASE_URL).hostname: 'spotify',
+}
+_STATE = struct.Struct('dd')  # tokens, last refill (wall clock, shared across processes)
+_warned_pid = None
+_patience = contextvars.ContextVar('rate_limit_patience', default=None)
+
+
+class RateLimited(Exception):
+    def __init__(self, provider, retry_after):
+        super().__init__(f'{provider} rate limit reached')
+        self.provider = provider
+        self.retry_after = retry_after
+        self.message = 'Upstream rate limit reached, try again shortly'
+        self.status_code = 503
+
+
+def provider_for(host):
+    return PROVIDER_HOSTS.get(host)
+
+
+def _limit(provider):
+    spec = os.getenv(f'RATE_LIMIT_{provider.upper()}', DEFAULT_LIMITS.get(provider, '0'))
+    rate, _, burst = spec.partition(',')
+    rate = float(rate)
+    return rate, float(burst or max(rate, 1))
+
+
+def bucket_dir():
+    shared = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.getenv('RATE_LIMIT_DIR', os.path.join(shared, 'weatherbeats-ratelimit'))
+
+
+def _take(provider, rate, burst):
+    """Take one token if available; otherwise return the seconds until one will be."""
+    directory = bucket_dir()
+    os.makedirs(directory, exist_ok=True)
+    fd = os.open(os.path.join(directory, provider), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        raw = os.pread(fd, _STATE.size, 0)
+        now = time.time()
+        tokens, last = _STATE.unpack(raw) if len(raw) == _STATE.size else (burst, now)
+        tokens = min(burst, tokens + max(0.0, now - last) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        os.pwrite(fd, _STATE.pack(tokens, now), 0)
+        return wait
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def max_wait(rate):
+    # An empty bucket refills one token every 1/rate seconds, so a fixed cap below
+    # that would shed every call past the burst instead of queueing it.
+    configured = os.getenv('RATE_LIMIT_MAX_WAIT')
+    wait = float(configured) if configured else max(0.25, 2 / rate)
+    patience = _patience.get()
+    return wait if patience is None else max(wait, patience)
+
+
+@contextmanager
+def patience(seconds):
+    """Let calls made in this block (on this thread) queue up to ``seconds`` for a token.
+
+    For work that has many calls to make and would rather be paced to the
+    budget than shed, such as one request geocoding a batch of cities.
+    """
+    token = _patience.set(seconds)
+    try:
+        yield
+    finally:
+        _patience.reset(token)
+
+
+def acquire(provider):
+    """Block briefly for a token from ``provider``'s bucket, or raise RateLimited."""
+    rate, burst = _limit(provider)
+    if rate <= 0:
+        return
+    deadline = time.monotonic() + max_wait(rate)
+    while True:
+        try:
+            wait = _take(provider, rate, burst)
+        except OSError:
+            _warn_unavailable()
+            return
+        if wait == 0:
+            return
+        if time.monotonic() + wait > deadline:
+            metrics.inc('weatherbeats_rate_limited_total', {'provider': provider})
+            raise RateLimited(provider, wait)
+        time.sleep(wait)
+
+
+def _warn_unavailable():
+    # Once per process; every upstream call would otherwise log it
+    global _warned_pid
+    if _warned_pid != os.getpid():
+        _warned_pid = os.getpid()
+        logging.exception(f'Rate-limit buckets in {bucket_dir()} unavailable; upstream calls are not throttled')
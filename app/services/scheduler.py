@@ -0,0 +1,69 @@
+"""A minimal in-process periodic job runner.
+
+Each job runs on the scheduler's own daemon thread inside an app context, so
+request workers never pay for background maintenance. Every gunicorn worker
+runs its own scheduler; jobs that must not overlap across workers coordinate
+through the database (row locks) rather than here.
+
+    SCHEDULER_ENABLED   "false" disables background jobs in this process (default "true")
+"""
+import logging
+import os
+import threading
+import time
+
+
+class _Job:
+    def __init__(self, name, interval, fn):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.next_run = time.monotonic() + interval
+
+
+class Scheduler:
+    def __init__(self):
+        self.jobs = []
+        self._app = None
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+
+    def add_job(self, name, interval, fn):
+        if any(job.name == name for job in self.jobs):
+            return
+        self.jobs.append(_Job(name, interval, fn))
+
+    def start(self, app):
+        if os.getenv('SCHEDULER_ENABLED', 'true').lower() == 'false':
+            return
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._app = app
+        self._pid = os.getpid()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_job(self, job):
+        try:
+            with self._app.app_context():
+                job.fn()
+        except Exception:
+            logging.exception(f'Scheduled job {job.name} failed')
+
+    def _run(self):
+        while not self._stop.is_set():
+            now = time.monotonic()
+            for job in self.jobs:
+                if job.next_run <= now:
+                    self.run_job(job)
+                    job.next_run = time.monotonic() + job.interval
+            next_run = min((job.next_run for job in self.jobs), default=now + 60)
+            self._stop.wait(max(0.0, next_run - time.monotonic()))
+
+
+scheduler = Scheduler()
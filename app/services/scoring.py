@@ -0,0 +1,112 @@
+"""Vectorized weather-to-track scoring.
+
+Audio features are packed into a float32 matrix (one row per track, one
+column per feature). A request's weather is turned into a target profile and
+per-feature weights, every track's weighted squared distance to it is computed
+in one NumPy pass, and the k closest tracks are picked with ``argpartition``
+instead of a full sort.
+"""
+import numpy as np
+
+FEATURE_COLUMNS = ('energy', 'valence', 'acousticness', 'danceability')
+WET_CONDITIONS = ('Rain', 'Drizzle', 'Thunderstorm', 'Snow')
+NEUTRAL = 0.5
+# At or below COLDEST (°C) reads as fully cold, at or above HOTTEST as fully hot
+COLDEST, HOTTEST = -10, 40
+# Humidity (%) and wind speed (m/s) above these shift the target energy
+HUMID_ABOVE, WINDY_ABOVE = 80, 10
+
+
+class FeatureMatrix:
+    def __init__(self, uris, values):
+        self.uris = uris
+        self.values = values
+
+    @classmethod
+    def from_features(cls, song_qualities):
+        song_qualities = [song for song in song_qualities if song and song.get('uri')]
+        return cls.from_columns({'uris': [song['uri'] for song in song_qualities],
+                                 **{column: [song.get(column) for song in song_qualities] for column in FEATURE_COLUMNS}})
+
+    @classmethod
+    def from_columns(cls, columns):
+        """Build from ``{'uris': [...], <feature>: [...], ...}``, one list per column (see ``to_columns``)."""
+        values = np.empty((len(columns['uris']), len(FEATURE_COLUMNS)), dtype=np.float32)
+        for i, column in enumerate(FEATURE_COLUMNS):
+            # None -> NaN on conversion; tracks missing a feature score as neutral on it.
+            values[:, i] = np.array(columns[column], dtype=np.float32)
+        np.nan_to_num(values, copy=False, nan=NEUTRAL)
+        return cls(list(columns['uris']), values)
+
+    def to_columns(self):
+        # JSON-friendly; from_columns rebuilds the matrix without touching a dict per track
+        return {'uris': self.uris, **{column: self.values[:, i].tolist() for i, column in enumerate(FEATURE_COLUMNS)}}
+
+    def __len__(self):
+        return len(self.uris)
+
+
+def target_profile(temperature, weather_condition, humidity=None, wind_speed=None):
+    """Return ``(target, weights)`` vectors over FEATURE_COLUMNS for the given weather."""
+    warmth = min(max((float(temperature) - COLDEST) / (HOTTEST - COLDEST), 0.0), 1.0)
+    energy = 0.15 + 0.7 * warmth
+    valence = 0.15 + 0.7 * warmth
+    acousticness, danceability = NEUTRAL, NEUTRAL
+    weights = [1.0, 1.0, 0.25, 0.25]
+
+    if weather_condition in WET_CONDITIONS:
+        acousticness, weights[2] = 0.8, 1.0
+    elif weather_condition == 'Clear':
+        danceability, weights[3] = 0.8, 1.0
+    else:
+        acousticness, weights[2] = 0.4, 0.5
+
+    if humidity is not None and float(humidity) > HUMID_ABOVE:
+        energy -= 0.1
+    if wind_speed is not None and float(wind_speed) > WINDY_ABOVE:
+        energy += 0.1
+
+    target = np.clip(np.array([energy, valence, acousticness, danceability], dtype=np.float32), 0.0, 1.0)
+    return target, np.array(weights, dtype=np.float32)
+
+
+def distances(matrix, target, weights):
+    return ((matrix.values - target) ** 2 * weights).sum(axis=1)
+
+
+def top_k(matrix, target, weights, k):
+    """Indices of the ``k`` tracks closest to ``target``, closest first."""
+    if len(matrix) == 0 or k <= 0:
+        return np.empty(0, dtype=np.intp)
+    return _smallest(distances(matrix, target, weights), k)
+
+
+def _smallest(scores, k):
+    if k < len(scores):
+        candidates = np.argpartition(scores, k)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(scores[candidates], kind='stable')]
+
+
+def rank_tracks(songs, weather_condition, temperature, humidity=None, wind_speed=None, k=20):
+    """Track URIs of the ``k`` best matches for the weather; ``songs`` is a FeatureMatrix or a list of feature dicts."""
+    matrix = songs if isinstance(songs, FeatureMatrix) else FeatureMatrix.from_features(songs)
+    target, weights = target_profile(temperature, weather_condition, humidity, wind_speed)
+    return [matrix.uris[i] for i in top_k(matrix, target, weights, k)]
+
+
+def rank_tracks_many(songs, weathers, k=20):
+    """``rank_tracks`` for several ``(condition, temperature, humidity, wind_speed)`` tuples over one pool.
+
+    Every target is scored against every track in a single broadcast pass.
+    """
+    matrix = songs if isinstance(songs, FeatureMatrix) else FeatureMatrix.from_features(songs)
+    if not weathers or len(matrix) == 0 or k <= 0:
+        return [[] for _ in weathers]
+    profiles = [target_profile(temperature, condition, humidity, wind_speed)
+                for condition, temperature, humidity, wind_speed in weathers]
+    targets = np.stack([target for target, _ in profiles])[:, None, :]
+    weights = np.stack([weight for _, weight in profiles])[:, None, :]
+    scores = ((matrix.values[None, :, :] - targets) ** 2 * weights).sum(axis=2)
+    return [[matrix.uris[i] for i in _smallest(row, k)] for row in scores]
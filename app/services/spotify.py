@@ -0,0 +1,58 @@
+import logging
+from app.services import http_client
+from app.services.upstreams import SPOTIFY_API_BASE_URL
+
+# Spotify API endpoints
+API_BASE_URL = f'{SPOTIFY_API_BASE_URL}/'
+
+
+class SpotifyError(Exception):
+    def __init__(self, message, status_code=502):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def auth_headers(access_token):
+    return {'Authorization': f'Bearer {access_token}'}
+
+
+def search_playlists(query, access_token, limit=1):
+    params = {'q': query, 'type': 'playlist', 'limit': limit}
+    response = http_client.get(API_BASE_URL + 'search', headers=auth_headers(access_token), params=params)
+    if response.status_code != 200:
+        raise SpotifyError('Failed to search playlists on Spotify', response.status_code)
+
+    data = response.json()
+    # Spotify pads search results with nulls for playlists it can't return
+    return [item['id'] for item in data['playlists']['items'] if item]
+
+
+def fetch_playlist_track_ids(playlist_id, access_token, max_tracks=None):
+    """Track IDs of a playlist, following pagination until ``max_tracks`` (if given) are collected."""
+    track_ids = []
+    url = f"{API_BASE_URL}playlists/{playlist_id}/tracks"
+    params = {'limit': 100, 'fields': 'items(track(id)),next'}
+    while url and (max_tracks is None or len(track_ids) < max_tracks):
+        response = http_client.get(url, headers=auth_headers(access_token), params=params)
+        logging.debug(f'Inside Get Playlist Tracks, Spotify response: {response.status_code}')
+        if response.status_code != 200:
+            raise SpotifyError('Failed to fetch tracks from Spotify', response.status_code)
+
+        data = response.json()
+        track_ids.extend(item['track']['id'] for item in data['items'] if item.get('track') and item['track'].get('id'))
+        # ``next`` already carries the paging query string
+        url, params = data.get('next'), None
+    return track_ids if max_tracks is None else track_ids[:max_tracks]
+
+
+def fetch_audio_features(track_ids, access_token):
+    params = {'ids': ','.join(track_ids)}
+    response = http_client.get(f"{API_BASE_URL}audio-features", headers=auth_headers(access_token), params=params)
+    if response.status_code != 200:
+        raise SpotifyError('Failed to fetch audio features from Spotify', response.status_code)
+
+    data = response.json()
+    if 'audio_features' not in data:
+        raise SpotifyError('Failed to extract audio features from Spotify response', 500)
+    return [features for features in data['audio_features'] if features]
@@ -0,0 +1,13 @@
+"""Base URLs of the upstream APIs, overridable so the app can run against local stubs (see ``benchmarks/stubs.py``).
+
+    LOCATIONIQ_BASE_URL         default https://us1.locationiq.com/v1
+    OPENWEATHER_BASE_URL        default https://api.openweathermap.org/data/2.5
+    SPOTIFY_API_BASE_URL        default https://api.spotify.com/v1
+    SPOTIFY_ACCOUNTS_BASE_URL   default https://accounts.spotify.com
+"""
+import os
+
+LOCATIONIQ_BASE_URL = os.getenv('LOCATIONIQ_BASE_URL', 'https://us1.locationiq.com/v1').rstrip('/')
+OPENWEATHER_BASE_URL = os.getenv('OPENWEATHER_BASE_URL', 'https://api.openweathermap.org/data/2.5').rstrip('/')
+SPOTIFY_API_BASE_URL = os.getenv('SPOTIFY_API_BASE_URL', 'https://api.spotify.com/v1').rstrip('/')
+SPOTIFY_ACCOUNTS_BASE_URL = os.getenv('SPOTIFY_ACCOUNTS_BASE_URL', 'https://accounts.spotify.com').rstrip('/')
@@ -0,0 +1,67 @@
+"""Short-TTL cache of OpenWeather conditions, bucketed on a coordinate grid.
+
+Coordinates are snapped to a grid so nearby lookups share an entry, and
+concurrent misses for the same cell collapse into one upstream call.
+
+    WEATHER_GRID_DEGREES    grid cell size in degrees (default 0.1)
+    WEATHER_CACHE_MINUTES   minutes conditions stay cached (default 10)
+    WEATHER_CACHE_SIZE      cells kept in memory (default 4096)
+    WEATHER_STALE_MINUTES   how old conditions may be when served because the
+                            OpenWeather budget is exhausted (default 180)
+"""
+import os
+
+from app.services import metrics
+from app.services.cache import MISSING, TTLCache
+from app.services.ratelimit import RateLimited
+from app.services.singleflight import SingleFlight
+
+GRID_DEGREES = float(os.getenv('WEATHER_GRID_DEGREES', 0.1))
+
+_cache = TTLCache(maxsize=int(os.getenv('WEATHER_CACHE_SIZE', 4096)), name='weather',
+                  ttl=float(os.getenv('WEATHER_CACHE_MINUTES', 10)) * 60)
+_stale = TTLCache(maxsize=int(os.getenv('WEATHER_CACHE_SIZE', 4096)),
+                  ttl=float(os.getenv('WEATHER_STALE_MINUTES', 180)) * 60)
+_flights = SingleFlight(name='weather')
+
+
+def snap_to_grid(lat, lon, grid=None):
+    grid = grid or GRID_DEGREES
+    return (round(round(float(lat) / grid) * grid, 6),
+            round(round(float(lon) / grid) * grid, 6))
+
+
+def cached_weather(lat, lon, fetch):
+    """Return conditions for the grid cell containing (lat, lon), calling ``fetch(lat, lon)`` at the cell centre on a miss."""
+    cell = snap_to_grid(lat, lon)
+    data = _cache.get(cell)
+    if data is not MISSING:
+        return data
+
+    def load():
+        try:
+            data = fetch(*cell)
+        except RateLimited:
+            # Out of OpenWeather budget: slightly old conditions beat a failed request
+            stale = _stale.get(cell)
+            if stale is MISSING:
+                raise
+            metrics.inc('weatherbeats_degraded_total', {'provider': 'openweather'})
+            return stale
+        _cache.set(cell, data)
+        _stale.set(cell, data)
+        return data
+
+    return _flights.do(cell, load)
+
+
+def stats():
+    cache_stats = _cache.stats()
+    flight_stats = _flights.stats()
+    return {
+        'size': cache_stats['size'],
+        'hits': cache_stats['hits'],
+        'coalesced': flight_stats['coalesced'],
+        'upstream_calls': flight_stats['executed'],
+        'upstream_calls_saved': cache_stats['hits'] + flight_stats['coalesced'],
+    }
@@ -0,0 +1,164 @@
+"""Precomputed track selections per country and weather bucket.
+
+Everyone asking for the same country in the same weather gets the same
+tracks, so a scheduled job ranks each stored country chart once per bucket
+(temperature band x condition x humid x windy) and keeps the results in the
+``weather_playlist`` table. /weather then reads its selection by primary key
+instead of loading the chart and scoring it. Selections are only served while
+the chart they came from is fresh; after that, requests go back to the live
+path, which refreshes the chart for the next run of the job.
+
+    WEATHER_PROFILE_BAND_DEGREES       width of a temperature band in °C (default 5)
+    WEATHER_PROFILE_REFRESH_INTERVAL   seconds between job runs (default 600)
+    WEATHER_PROFILE_LOCAL_TTL          seconds lookups stay in the in-process tier (default 300)
+"""
+import logging
+import math
+import os
+from datetime import datetime
+
+from sqlalchemy import and_, delete, exists, func, insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from app.services import metrics
+from app.services.cache import MISSING, TTLCache
+from app.services.charts import FRESH_FOR, chart_key, feature_matrix
+from app.services.scoring import COLDEST, HOTTEST, HUMID_ABOVE, WET_CONDITIONS, WINDY_ABOVE, rank_tracks_many
+from models.chart import CountryChart
+from models.weather_playlist import WeatherPlaylist
+
+# A condition scoring the same as every other condition of its kind
+CONDITIONS = {'wet': 'Rain', 'clear': 'Clear', 'other': 'Clouds'}
+
+_local = TTLCache(maxsize=4096, ttl=int(os.getenv('WEATHER_PROFILE_LOCAL_TTL', 300)), name='weather_profile_local')
+# country -> fetched_at of the chart its stored selections came from
+_versions = TTLCache(maxsize=512, ttl=int(os.getenv('WEATHER_PROFILE_LOCAL_TTL', 300)))
+_counters = {'hits': 0, 'misses': 0, 'countries_computed': 0}
+
+
+def band_degrees():
+    return float(os.getenv('WEATHER_PROFILE_BAND_DEGREES', 5))
+
+
+def bucket_for(temperature, weather_condition, humidity=None, wind_speed=None):
+    width = band_degrees()
+    bands = math.ceil((HOTTEST - COLDEST) / width)
+    band = min(max(int((float(temperature) - COLDEST) // width), 0), bands - 1)
+    if weather_condition in WET_CONDITIONS:
+        kind = 'wet'
+    elif weather_condition == 'Clear':
+        kind = 'clear'
+    else:
+        kind = 'other'
+    humid = 'humid' if humidity is not None and float(humidity) > HUMID_ABOVE else 'dry'
+    windy = 'windy' if wind_speed is not None and float(wind_speed) > WINDY_ABOVE else 'calm'
+    return f'{COLDEST + band * width:g}:{kind}:{humid}:{windy}'
+
+
+def all_buckets():
+    """Every bucket, with the weather it is ranked for: ``{bucket: (temperature, condition, humidity, wind_speed)}``."""
+    width = band_degrees()
+    buckets = {}
+    for band in range(math.ceil((HOTTEST - COLDEST) / width)):
+        low = COLDEST + band * width
+        temperature = min(low + width / 2, HOTTEST)
+        for condition in CONDITIONS.values():
+            for humidity in (None, HUMID_ABOVE + 10):
+                for wind_speed in (None, WINDY_ABOVE + 5):
+                    weather = (temperature, condition, humidity, wind_speed)
+                    buckets[bucket_for(low, condition, humidity, wind_speed)] = weather
+    return buckets
+
+
+def _track_count():
+    return int(os.getenv('PLAYLIST_TRACK_COUNT', 20))
+
+
+def compute(chart):
+    """Rank ``chart`` (a CountryChart) for every bucket and replace the country's stored selections."""
+    matrix = feature_matrix(chart.payload)
+    buckets = all_buckets()
+    ranked = rank_tracks_many(matrix, [(condition, temperature, humidity, wind_speed)
+                                       for temperature, condition, humidity, wind_speed in buckets.values()],
+                              k=_track_count())
+    now = datetime.utcnow()
+    rows = [{'country': chart.country, 'bucket': bucket, 'chart_fetched_at': chart.fetched_at, 'computed_at': now,
+             'track_uris': track_uris}
+            for bucket, track_uris in zip(buckets, ranked)]
+    db.session.execute(delete(WeatherPlaylist).where(WeatherPlaylist.country == chart.country))
+    db.session.execute(insert(WeatherPlaylist), rows)
+
+
+def refresh_profiles():
+    """Recompute selections for every fresh chart they don't yet reflect; returns the number of countries done.
+
+    Each country is claimed with FOR UPDATE SKIP LOCKED and committed on its
+    own, so workers running this job at once split the charts between them.
+    """
+    attempted = set()
+    computed = 0
+    while True:
+        current = exists().where(and_(WeatherPlaylist.country == CountryChart.country,
+                                      WeatherPlaylist.chart_fetched_at == CountryChart.fetched_at))
+        query = CountryChart.query.filter(CountryChart.fetched_at > datetime.utcnow() - FRESH_FOR, ~current)
+        if attempted:
+            query = query.filter(CountryChart.country.notin_(attempted))
+        chart = query.order_by(CountryChart.fetched_at.desc()).with_for_update(skip_locked=True).first()
+        if chart is None:
+            break
+        attempted.add(chart.country)
+        try:
+            compute(chart)
+            db.session.commit()
+            computed += 1
+        except SQLAlchemyError:
+            logging.exception(f'Precomputing weather playlists for {chart.country} failed')
+            db.session.rollback()
+    _counters['countries_computed'] += computed
+    return computed
+
+
+def available(country):
+    """Whether fresh precomputed selections exist for ``country``, so its chart needn't be loaded."""
+    key = chart_key(country)
+    fetched_at = _versions.get(key)
+    if fetched_at is MISSING:
+        try:
+            fetched_at = db.session.query(func.max(WeatherPlaylist.chart_fetched_at)) \
+                .filter(WeatherPlaylist.country == key).scalar()
+        except SQLAlchemyError:
+            logging.exception('Weather playlist read failed')
+            db.session.rollback()
+            return False
+        if fetched_at is None:
+            return False
+        _versions.set(key, fetched_at)
+    return datetime.utcnow() - fetched_at < FRESH_FOR
+
+
+def lookup(country, weather_condition, temperature, humidity=None, wind_speed=None):
+    """The precomputed track URIs for this country and weather, or None."""
+    cache_key = (chart_key(country), bucket_for(temperature, weather_condition, humidity, wind_speed))
+    track_uris = _local.get(cache_key)
+    if track_uris is MISSING:
+        try:
+            row = db.session.get(WeatherPlaylist, cache_key)
+        except SQLAlchemyError:
+            logging.exception('Weather playlist read failed')
+            db.session.rollback()
+            row = None
+        track_uris = row.track_uris if row is not None else None
+        if track_uris is not None:
+            _local.set(cache_key, track_uris)
+    if track_uris is None:
+        _counters['misses'] += 1
+        metrics.inc('weatherbeats_cache_requests_total', {'cache': 'weather_profile', 'result': 'miss'})
+        return None
+    _counters['hits'] += 1
+    metrics.inc('weatherbeats_cache_requests_total', {'cache': 'weather_profile', 'result': 'hit'})
+    return track_uris[:_track_count()]
+
+
+def stats():
+    return dict(_counters, local_size=len(_local))
@@ -0,0 +1,79 @@
+"""Database round trips per request for the auth and playlist endpoints.
+
+Counts statements (``before_cursor_execute``) and commits on the engine while
+each request runs through the test client against stub upstreams. Caches are
+warmed by a first request; both the first and a repeat request are reported.
+
+    python -m benchmarks.bench_queries
+"""
+import argparse
+from collections import Counter
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from benchmarks.harness import BENCH_ACCESS_TOKEN, make_app
+from benchmarks.stubs import StubUpstreams
+
+AUTH = {'Authorization': f'Bearer {BENCH_ACCESS_TOKEN}'}
+
+
+@contextmanager
+def counting(engine):
+    counts = Counter()
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        counts['statements'] += 1
+        counts[statement.split(None, 1)[0].upper()] += 1
+
+    def on_commit(conn):
+        counts['commits'] += 1
+
+    event.listen(engine, 'before_cursor_execute', on_execute)
+    event.listen(engine, 'commit', on_commit)
+    try:
+        yield counts
+    finally:
+        event.remove(engine, 'before_cursor_execute', on_execute)
+        event.remove(engine, 'commit', on_commit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args()
+
+    with StubUpstreams(latency=0) as stubs:
+        # The default (database) ephemeral store, so /login's write shows up
+        app = make_app(stubs.url, {'EPHEMERAL_BACKEND': 'db'})
+        from app import db
+        with app.app_context():
+            engine = db.engine
+        client = app.test_client()
+
+        def callback():
+            session_id = client.get('/login').get_json()['session_id']
+            return client.get('/callback', query_string={'code': 'stub-code', 'session_id': session_id})
+
+        def callback_then_weather():
+            token = callback().get_json()['access_token']
+            return client.post('/weather', json={'city': 'London'}, headers={'Authorization': f'Bearer {token}'})
+
+        requests = [
+            ('GET /login', lambda: client.get('/login')),
+            ('GET /login + /callback', callback),
+            ('POST /weather', lambda: client.post('/weather', json={'city': 'London'}, headers=AUTH)),
+            ('GET /search', lambda: client.get('/search', query_string={'country': 'United Kingdom'}, headers=AUTH)),
+            ('/callback then /weather', callback_then_weather),
+        ]
+        for label, request in requests:
+            for attempt in ('first', 'repeat'):
+                with counting(engine) as counts:
+                    status = request().status_code
+                detail = ' '.join(f'{verb}={n}' for verb, n in sorted(counts.items())
+                                  if verb not in ('statements', 'commits'))
+                print(f"{label:<26} {attempt:<6} status={status} statements={counts['statements']:<3} "
+                      f"commits={counts['commits']:<2} {detail}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Micro-benchmark: vectorized scoring engine vs. the original filter_songs_by_weather.
+
+    python -m benchmarks.bench_scoring --pool-sizes 50 1000 5000
+"""
+import argparse
+import json
+import random
+
+from benchmarks.harness import summarize, time_calls
+from app.services.scoring import FeatureMatrix, rank_tracks
+
+
+def legacy_filter_songs_by_weather(song_qualities, weather_condition, temperature):
+    # The list-comprehension implementation the scoring engine replaced, minus its prints.
+    temperature = float(temperature)
+    if temperature > 30:
+        filtered_songs = [song for song in song_qualities if song['energy'] > 0.7 and song['valence'] > 0.7]
+    elif temperature < 10:
+        filtered_songs = [song for song in song_qualities if song['energy'] < 0.3 and song['valence'] < 0.3]
+    elif weather_condition in ['Rain', 'Snow']:
+        filtered_songs = [song for song in song_qualities if song['acousticness'] > 0.5]
+    elif weather_condition == 'Clear':
+        filtered_songs = [song for song in song_qualities if song['danceability'] > 0.7]
+    else:
+        filtered_songs = [song for song in song_qualities if 0.3 <= song['energy'] <= 0.7 and 0.3 <= song['valence'] <= 0.7]
+    songs_to_use = filtered_songs if len(filtered_songs) >= 10 else song_qualities[:10]
+    return [song['uri'] for song in songs_to_use]
+
+
+def make_pool(size, seed=7):
+    rnd = random.Random(seed)
+    return [{'id': f't{i}', 'uri': f'spotify:track:t{i}', 'energy': rnd.random(), 'valence': rnd.random(),
+             'acousticness': rnd.random(), 'danceability': rnd.random()} for i in range(size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pool-sizes', type=int, nargs='+', default=[50, 1000, 5000])
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('-k', type=int, default=20)
+    args = parser.parse_args()
+
+    for size in args.pool_sizes:
+        pool = make_pool(size)
+        matrix = FeatureMatrix.from_features(pool)
+        print(f'-- pool of {size} tracks')
+        print(summarize('legacy filter', time_calls(lambda: legacy_filter_songs_by_weather(pool, 'Clouds', 18), args.iterations)))
+        print(summarize('engine (from dicts)', time_calls(lambda: rank_tracks(pool, 'Clouds', 18, 70, 4, k=args.k), args.iterations)))
+        columns = json.loads(json.dumps(matrix.to_columns()))  # as read back from a stored chart
+        print(summarize('engine (stored columns)', time_calls(lambda: rank_tracks(FeatureMatrix.from_columns(columns), 'Clouds', 18, 70, 4, k=args.k), args.iterations)))
+        print(summarize('engine (cached matrix)', time_calls(lambda: rank_tracks(matrix, 'Clouds', 18, 70, 4, k=args.k), args.iterations)))
+
+
+if __name__ == '__main__':
+    main()
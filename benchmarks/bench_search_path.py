@@ -0,0 +1,42 @@
+"""Compare the old HTTP self-loopback to /search with the in-process service call.
+
+    python -m benchmarks.bench_search_path --iterations 200 --latency 0.02
+"""
+import argparse
+
+import requests
+
+from benchmarks.harness import BENCH_ACCESS_TOKEN, NO_CACHE_ENV, LocalServer, make_app, summarize, time_calls
+from benchmarks.stubs import StubUpstreams
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds of latency per stub upstream call')
+    parser.add_argument('--country', default='United Kingdom')
+    args = parser.parse_args()
+
+    with StubUpstreams(latency=args.latency) as stubs:
+        # Caches off, so both paths reach the stub upstreams and --latency applies
+        app = make_app(stubs.url, NO_CACHE_ENV)
+        from app.routes.weather import get_spotify_data
+
+        with LocalServer(app) as server:
+            headers = {'Authorization': f'Bearer {BENCH_ACCESS_TOKEN}'}
+
+            def loopback():
+                response = requests.get(f'{server.url}/search', params={'country': args.country}, headers=headers)
+                response.raise_for_status()
+                return response.json()
+
+            def in_process():
+                with app.app_context():
+                    return get_spotify_data(args.country, BENCH_ACCESS_TOKEN)
+
+            print(summarize('loopback GET /search', time_calls(loopback, args.iterations)))
+            print(summarize('in-process service call', time_calls(in_process, args.iterations)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Startup cost: create_app() in a fresh interpreter, and gunicorn worker boot with and without preload.
+
+Worker boot time is what every recycled worker pays again, so it is measured
+from fork to ready (gunicorn.conf.py logs it per worker).
+
+    python -m benchmarks.bench_startup --runs 5 --workers 3
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.load_concurrency import REPO_ROOT, _free_port, _wait_until_up
+from benchmarks.stubs import StubUpstreams
+
+CREATE_APP = '''
+import time
+start = time.perf_counter()
+from benchmarks.harness import make_app
+make_app()
+print(time.perf_counter() - start)
+'''
+READY = re.compile(r'Worker \d+ ready in ([0-9.]+)s')
+
+
+def time_create_app(runs):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', CREATE_APP], cwd=REPO_ROOT, check=True,
+                                capture_output=True, text=True, env=dict(os.environ, LOG_LEVEL='WARNING')).stdout
+        samples.append(float(output.split()[-1]))
+    return samples
+
+
+def time_gunicorn_boot(preload, workers, stub_url):
+    port = _free_port()
+    env = dict(os.environ, STUB_UPSTREAM_URL=stub_url, GUNICORN_PRELOAD=str(preload).lower(),
+               GUNICORN_WORKER_CLASS='sync', GUNICORN_WORKERS=str(workers), GUNICORN_BIND=f'127.0.0.1:{port}')
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--log-level', 'info',
+         '--access-logfile', '/dev/null', 'benchmarks.stub_wsgi:app'],
+        cwd=REPO_ROOT, env=env, stderr=subprocess.PIPE, text=True)
+    try:
+        _wait_until_up(f'http://127.0.0.1:{port}/login')
+        first_response = time.perf_counter() - start
+    finally:
+        process.terminate()
+        _, stderr = process.communicate()
+    return first_response, [float(seconds) for seconds in READY.findall(stderr)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=3)
+    args = parser.parse_args()
+
+    samples = time_create_app(args.runs)
+    print(f'create_app in a fresh interpreter  median={statistics.median(samples) * 1000:8.1f}ms '
+          f'max={max(samples) * 1000:8.1f}ms')
+
+    with StubUpstreams() as stubs:
+        for preload in (False, True):
+            first_responses, boots = [], []
+            for _ in range(args.runs):
+                first_response, worker_boots = time_gunicorn_boot(preload, args.workers, stubs.url)
+                first_responses.append(first_response)
+                boots.extend(worker_boots)
+            print(f'gunicorn preload={str(preload):<5}  first response median={statistics.median(first_responses) * 1000:8.1f}ms '
+                  f'worker boot median={statistics.median(boots) * 1000:8.1f}ms max={max(boots) * 1000:8.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
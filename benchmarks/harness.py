@@ -0,0 +1,111 @@
+"""Shared helpers for the benchmark scripts: app bootstrap and latency stats."""
+import os
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+from socketserver import ThreadingMixIn
+
+BENCH_ACCESS_TOKEN = 'bench-access-token'
+
+# Every request misses the caches and waits on the upstreams
+NO_CACHE_ENV = {
+    'CHART_FRESH_SECONDS': '0',
+    'CHART_MAX_AGE_SECONDS': '0',
+    'CHART_LOCAL_TTL': '0',
+    'WEATHER_CACHE_MINUTES': '0',
+    'GEOCODE_CACHE_TTL': '0',
+}
+
+
+def make_app(upstream_url=None, env=None):
+    """Build the app against a throwaway SQLite file and seed one logged-in user.
+
+    ``upstream_url`` points every upstream API at a ``benchmarks.stubs`` server;
+    ``env`` sets further configuration. Both must be applied before the app is
+    first imported, since settings are read at import time.
+    """
+    bench_dir = tempfile.mkdtemp(prefix='weatherbeats-bench-')
+    os.environ['SQLALCHEMY_TEST_DATABASE_URI'] = f"sqlite:///{os.path.join(bench_dir, 'bench.db')}"
+    os.environ.setdefault('SCHEDULER_ENABLED', 'false')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('EPHEMERAL_BACKEND', 'file')
+    os.environ.setdefault('EPHEMERAL_DIR', os.path.join(bench_dir, 'ephemeral'))
+    os.environ.setdefault('RATE_LIMIT_DIR', os.path.join(bench_dir, 'ratelimit'))
+    os.environ.setdefault('METRICS_DIR', os.path.join(bench_dir, 'metrics'))
+    if upstream_url:
+        from benchmarks.stubs import stub_environment
+        os.environ.update(stub_environment(upstream_url))
+        # The stubs share one host, so per-provider budgets can't tell them apart
+        for provider in ('LOCATIONIQ', 'OPENWEATHER', 'SPOTIFY'):
+            os.environ.setdefault(f'RATE_LIMIT_{provider}', '0')
+    os.environ.update(env or {})
+
+    from app import create_app, db
+    from models.user import User
+
+    app = create_app({'TESTING': True})
+    with app.app_context():
+        db.create_all()
+        expires_at = datetime.now() + timedelta(hours=1)
+        db.session.add(User(user_id='stubuser', access_token=BENCH_ACCESS_TOKEN,
+                            refresh_token='bench-refresh-token', expires_at=expires_at))
+        db.session.commit()
+    return app
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class LocalServer:
+    """Serve a WSGI app on a local port from a background thread."""
+
+    def __init__(self, app):
+        self.server = make_server('127.0.0.1', 0, app, server_class=_ThreadingWSGIServer, handler_class=_QuietHandler)
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_port}'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def time_calls(fn, iterations, warmup=3):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(label, samples):
+    return (f'{label:<28} n={len(samples):<5} '
+            f'p50={percentile(samples, 50) * 1000:8.2f}ms '
+            f'p99={percentile(samples, 99) * 1000:8.2f}ms '
+            f'mean={statistics.mean(samples) * 1000:8.2f}ms')
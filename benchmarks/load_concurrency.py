@@ -0,0 +1,107 @@
+"""Load test: in-flight request scaling of sync vs. gevent gunicorn workers.
+
+Starts stub upstreams with fixed latency, boots gunicorn with the repo's
+gunicorn.conf.py for each worker class, and fires GET /search at increasing
+client concurrency. Caches are turned off so every request waits on the stubs.
+
+    python -m benchmarks.load_concurrency --worker-class sync gevent --concurrency 1 10 50 200
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.harness import BENCH_ACCESS_TOKEN, NO_CACHE_ENV, percentile
+from benchmarks.stubs import StubUpstreams
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_until_up(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f'gunicorn did not come up at {url}')
+
+
+def start_gunicorn(worker_class, workers, stub_url):
+    port = _free_port()
+    env = dict(os.environ, **NO_CACHE_ENV,
+               STUB_UPSTREAM_URL=stub_url,
+               GUNICORN_WORKER_CLASS=worker_class,
+               GUNICORN_WORKERS=str(workers),
+               GUNICORN_BIND=f'127.0.0.1:{port}')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--log-level', 'warning',
+         '--access-logfile', '/dev/null', 'benchmarks.stub_wsgi:app'],
+        cwd=REPO_ROOT, env=env)
+    url = f'http://127.0.0.1:{port}'
+    _wait_until_up(url)
+    return process, url
+
+
+def run_level(url, concurrency, requests_per_client):
+    headers = {'Authorization': f'Bearer {BENCH_ACCESS_TOKEN}'}
+
+    def client(_):
+        session = requests.Session()
+        samples, errors = [], 0
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            try:
+                response = session.get(f'{url}/search', params={'country': 'United Kingdom'}, headers=headers, timeout=60)
+                errors += response.status_code != 200
+            except requests.RequestException:
+                errors += 1
+            samples.append(time.perf_counter() - start)
+        return samples, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(client, range(concurrency)))
+    elapsed = time.perf_counter() - start
+    samples = [s for client_samples, _ in results for s in client_samples]
+    errors = sum(client_errors for _, client_errors in results)
+    return len(samples) / elapsed, samples, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--worker-class', nargs='+', default=['sync', 'gevent'])
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50, 200])
+    parser.add_argument('--requests-per-client', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.1, help='seconds of latency per stub upstream call')
+    args = parser.parse_args()
+
+    with StubUpstreams(latency=args.latency) as stubs:
+        for worker_class in args.worker_class:
+            process, url = start_gunicorn(worker_class, args.workers, stubs.url)
+            try:
+                for concurrency in args.concurrency:
+                    throughput, samples, errors = run_level(url, concurrency, args.requests_per_client)
+                    print(f'{worker_class:<7} workers={args.workers} concurrency={concurrency:<4} '
+                          f'rps={throughput:8.1f} p50={percentile(samples, 50) * 1000:8.1f}ms '
+                          f'p99={percentile(samples, 99) * 1000:8.1f}ms errors={errors}')
+            finally:
+                process.terminate()
+                process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""Load test of the public endpoints against stub upstreams, with stored baselines.
+
+Builds the app with ``create_app(test_config)`` (see ``harness.make_app``),
+points every upstream at ``benchmarks.stubs`` and drives /weather, /weather/batch, /search,
+/login and /callback from concurrent clients through Flask's test client,
+so no gunicorn or network setup is involved. Reports throughput and latency
+percentiles per endpoint and concurrency level.
+
+    python -m benchmarks.load_endpoints --save-baseline
+    python -m benchmarks.load_endpoints --compare
+
+``--compare`` exits non-zero when p95 latency rises, or throughput falls, by
+more than ``--tolerance`` against the stored baseline and by more than
+``--min-delta-ms`` per request, so sub-millisecond jitter on the cheap
+endpoints is not reported. Scenarios the baseline doesn't cover are named
+in a warning rather than skipped silently. Baselines are machine specific: record one on the
+machine that runs the comparison. Much above 8 concurrent clients, /callback
+mostly measures SQLite write locking rather than the app.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.harness import BENCH_ACCESS_TOKEN, NO_CACHE_ENV, make_app, percentile
+from benchmarks.stubs import StubUpstreams
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'load_endpoints.json')
+CITIES = ['London', 'Paris', 'Berlin', 'Madrid', 'Rome', 'Lisbon', 'Dublin', 'Vienna']
+AUTH = {'Authorization': f'Bearer {BENCH_ACCESS_TOKEN}'}
+
+
+def weather(client, i):
+    return client.post('/weather', json={'city': CITIES[i % len(CITIES)]}, headers=AUTH)
+
+
+def weather_batch(client, i):
+    cities = [CITIES[(i + n) % len(CITIES)] for n in range(4)]
+    response = client.post('/weather/batch', json={'cities': cities}, headers=AUTH)
+    response.get_data()  # drain the stream so the whole batch is timed
+    return response
+
+
+def search(client, i):
+    return client.get('/search', query_string={'country': 'United Kingdom'}, headers=AUTH)
+
+
+def login(client, i):
+    return client.get('/login')
+
+
+def callback(client, i):
+    # Only the callback is timed; the login that creates its session happens in prepare()
+    return client.get('/callback', query_string={'code': f'stub-code-{i}', 'session_id': client.session_id})
+
+
+def prepare_callback(client):
+    client.session_id = client.get('/login').get_json()['session_id']
+
+
+SCENARIOS = {
+    'weather': (weather, None),
+    'weather_batch': (weather_batch, None),
+    'search': (search, None),
+    'login': (login, None),
+    'callback': (callback, prepare_callback),
+}
+
+
+def run_level(app, scenario, concurrency, requests_per_client):
+    call, prepare = SCENARIOS[scenario]
+
+    def client(client_index):
+        test_client = app.test_client()
+        if prepare:
+            prepare(test_client)
+        call(test_client, -1 - client_index)  # warm up connections and per-thread state
+        samples, errors = [], 0
+        for n in range(requests_per_client):
+            if prepare:
+                prepare(test_client)
+            start = time.perf_counter()
+            response = call(test_client, client_index * requests_per_client + n)
+            samples.append(time.perf_counter() - start)
+            errors += response.status_code >= 400
+        return samples, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(client, range(concurrency)))
+    elapsed = time.perf_counter() - start
+    samples = [s for client_samples, _ in results for s in client_samples]
+    return {
+        'requests': len(samples),
+        'errors': sum(client_errors for _, client_errors in results),
+        'rps': round(len(samples) / elapsed, 1),
+        'p50_ms': round(percentile(samples, 50) * 1000, 2),
+        'p95_ms': round(percentile(samples, 95) * 1000, 2),
+        'p99_ms': round(percentile(samples, 99) * 1000, 2),
+    }
+
+
+def missing(results, baseline):
+    return [f'{scenario} c={concurrency}' for scenario, levels in results.items()
+            for concurrency in levels if concurrency not in baseline.get(scenario, {})]
+
+
+def regressions(results, baseline, tolerance, min_delta_ms):
+    found = []
+    for scenario, levels in results.items():
+        for concurrency, result in levels.items():
+            expected = baseline.get(scenario, {}).get(concurrency)
+            if not expected:
+                continue
+            p95_delta = result['p95_ms'] - expected['p95_ms']
+            if p95_delta > min_delta_ms and result['p95_ms'] > expected['p95_ms'] * (1 + tolerance):
+                found.append(f"{scenario} c={concurrency}: p95 {result['p95_ms']}ms vs baseline {expected['p95_ms']}ms")
+            # Compare throughput as the time each client spends per request
+            per_request_delta = int(concurrency) * (1000 / result['rps'] - 1000 / expected['rps'])
+            if per_request_delta > min_delta_ms and result['rps'] < expected['rps'] * (1 - tolerance):
+                found.append(f"{scenario} c={concurrency}: {result['rps']} rps vs baseline {expected['rps']} rps")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--requests-per-client', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds of latency per stub upstream call')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of stub upstream calls that fail')
+    parser.add_argument('--cold', action='store_true', help='disable the caches so every request reaches the stubs')
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE, metavar='PATH')
+    parser.add_argument('--compare', nargs='?', const=DEFAULT_BASELINE, metavar='PATH')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed fractional regression')
+    parser.add_argument('--min-delta-ms', type=float, default=10.0, help='ignore regressions smaller than this')
+    args = parser.parse_args()
+
+    results = {}
+    with StubUpstreams(latency=args.latency, error_rate=args.error_rate) as stubs:
+        # Pool enough upstream connections that concurrent clients don't churn them
+        env = dict(NO_CACHE_ENV if args.cold else {}, HTTP_POOL_SIZE=str(4 * max(args.concurrency)))
+        app = make_app(stubs.url, env)
+        for scenario in args.scenario:
+            results[scenario] = {}
+            for concurrency in args.concurrency:
+                result = run_level(app, scenario, concurrency, args.requests_per_client)
+                results[scenario][str(concurrency)] = result
+                print(f"{scenario:<9} concurrency={concurrency:<4} rps={result['rps']:8.1f} "
+                      f"p50={result['p50_ms']:8.1f}ms p95={result['p95_ms']:8.1f}ms "
+                      f"p99={result['p99_ms']:8.1f}ms errors={result['errors']}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Baseline written to {args.save_baseline}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for line in missing(results, baseline):
+            print(f'WARNING no baseline for {line}; not compared (re-record with --save-baseline)')
+        found = regressions(results, baseline, args.tolerance, args.min_delta_ms)
+        for line in found:
+            print(f'REGRESSION {line}')
+        if found:
+            sys.exit(1)
+        print('No regressions against baseline')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+"""WSGI entry point for running the real app under gunicorn against stub upstreams.
+
+Used by the load tests: ``STUB_UPSTREAM_URL`` points every upstream call at a
+running ``benchmarks.stubs`` server. Caches are expected to be disabled via
+the environment so each request actually waits on the stubs.
+"""
+import os
+
+from benchmarks.harness import make_app
+
+app = make_app(os.environ['STUB_UPSTREAM_URL'])
@@ -0,0 +1,159 @@
+"""Local stand-ins for LocationIQ, OpenWeather and the Spotify Web and accounts APIs.
+
+Responses are shaped like the real APIs closely enough for the app's code
+paths; every request sleeps for ``latency`` seconds to mimic a remote hop, and
+a fraction ``error_rate`` of requests fails with ``error_status``. Point the
+app at a running stub with ``stub_environment(url)``, or run one standalone:
+
+    python -m benchmarks.stubs --port 8900 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TRACK_COUNT = 50
+STUB_USER_ID = 'stubuser'
+_token_ids = itertools.count(1)
+
+
+def _track_id(i):
+    return f'stubtrack{i:04d}'
+
+
+def _audio_features(track_id):
+    rnd = random.Random(track_id)
+    return {
+        'id': track_id,
+        'uri': f'spotify:track:{track_id}',
+        'energy': rnd.random(),
+        'valence': rnd.random(),
+        'acousticness': rnd.random(),
+        'danceability': rnd.random(),
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this, delayed ACKs add ~40ms per call
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self, method):
+        time.sleep(self.server.latency)
+        parsed = urllib.parse.urlparse(self.path)
+        path = parsed.path
+        query = urllib.parse.parse_qs(parsed.query)
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            return self._send(self.server.error_status, {'error': 'injected stub failure'})
+
+        if path.endswith('/search.php'):
+            return self._send(200, [{'lat': '51.5073', 'lon': '-0.1277', 'display_name': 'London, Greater London, England, United Kingdom'}])
+        if path.endswith('/data/2.5/weather'):
+            return self._send(200, {'weather': [{'main': 'Clouds', 'description': 'broken clouds'}], 'main': {'temp': 14.2, 'humidity': 71}, 'wind': {'speed': 4.1}})
+        if path.endswith('/v1/search'):
+            return self._send(200, {'playlists': {'items': [{'id': 'stubplaylist'}]}})
+        if '/v1/playlists/' in path and path.endswith('/tracks'):
+            if method == 'POST':
+                return self._send(201, {'snapshot_id': 'stubsnapshot'})
+            if method == 'PUT':
+                return self._send(200, {'snapshot_id': 'stubsnapshot'})
+            return self._send(200, {'items': [{'track': {'id': _track_id(i)}} for i in range(TRACK_COUNT)], 'next': None})
+        if path.endswith('/v1/audio-features'):
+            ids = query.get('ids', [''])[0].split(',')
+            return self._send(200, {'audio_features': [_audio_features(track_id) for track_id in ids if track_id]})
+        if path.endswith('/v1/me/playlists'):
+            return self._send(200, {'items': [{'id': 'stubexisting', 'name': 'Stub Playlist', 'owner': {'id': 'stubuser'}}], 'next': None})
+        if path.endswith('/v1/me'):
+            # Tokens handed out by /api/token map to their own user; anything else is the seeded bench user
+            token = self.headers.get('Authorization', '').rpartition(' ')[2]
+            user_id = token.replace('stub-access-', 'stubuser-') if token.startswith('stub-access-') else STUB_USER_ID
+            return self._send(200, {'id': user_id})
+        if '/v1/users/' in path and path.endswith('/playlists'):
+            return self._send(201, {'id': 'stubcreated'})
+        if path.endswith('/api/token'):
+            token_id = next(_token_ids)
+            return self._send(200, {'access_token': f'stub-access-{token_id}', 'refresh_token': f'stub-refresh-{token_id}',
+                                    'expires_in': 3600})
+        return self._send(404, {'error': 'unknown stub route', 'path': path})
+
+    def do_GET(self):
+        self._route('GET')
+
+    def do_POST(self):
+        self._route('POST')
+
+    def do_PUT(self):
+        self._route('PUT')
+
+
+def stub_environment(url):
+    """Environment variables that point every upstream base URL at the stub server at ``url``."""
+    return {
+        'LOCATIONIQ_BASE_URL': f'{url}/v1',
+        'OPENWEATHER_BASE_URL': f'{url}/data/2.5',
+        'SPOTIFY_API_BASE_URL': f'{url}/v1',
+        'SPOTIFY_ACCOUNTS_BASE_URL': url,
+    }
+
+
+class StubUpstreams:
+    def __init__(self, latency=0.02, host='127.0.0.1', port=0, error_rate=0.0, error_status=503):
+        self.server = ThreadingHTTPServer((host, port), StubHandler)
+        self.server.daemon_threads = True
+        self.server.latency = latency
+        self.server.error_rate = error_rate
+        self.server.error_status = error_status
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds of latency per request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests that fail')
+    parser.add_argument('--error-status', type=int, default=503)
+    args = parser.parse_args()
+
+    with StubUpstreams(args.latency, args.host, args.port, args.error_rate, args.error_status) as stubs:
+        for name, value in stub_environment(stubs.url).items():
+            print(f'{name}={value}')
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,37 @@
 # gunicorn.conf.py
+import os
+import time
+
+from dotenv import load_dotenv
+
+# Settings below, and logging set up in post_fork before the app is imported, read .env too
+load_dotenv()
 
 # The socket to bind. A string of the form: 'HOST', 'HOST:PORT', 'unix:PATH'. An IP is a valid HOST.
-bind = '0.0.0.0:8000'  # Change as needed
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')  # Change as needed
 
 # The number of worker processes for handling requests.
-workers = 3  # Adjust as per your machine's capability
+workers = int(os.getenv('GUNICORN_WORKERS', 3))  # Adjust as per your machine's capability
+
+# The type of workers. Nearly all of a request's time is spent waiting on LocationIQ,
+# OpenWeather and Spotify, so 'gevent' (cooperative, non-blocking sockets) lets each
+# worker keep hundreds of requests in flight. 'sync' handles one request per worker.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+
+# The maximum number of simultaneous clients per worker (gevent workers only).
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+# Build the app once in the master so workers fork ready to serve, and a recycled
+# worker boots without re-importing anything. Off by default for gevent: modules
+# imported before the worker monkey-patches keep real, hub-blocking locks.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'false' if worker_class == 'gevent' else 'true').lower() == 'true'
+if preload_app:
+    # Per-worker setup (DB pool, scheduler, log listener) then happens in post_fork
+    os.environ['DEFER_WORKER_INIT'] = 'true'
+
+# Restart a worker after this many requests (plus up to the jitter), 0 to disable.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 0))
 
 # The number of seconds to wait for requests on a Keep-Alive connection.
 keepalive = 2
@@ -22,4 +49,38 @@ accesslog = '-'
 errorlog = '-'
 
 # The granularity of Error log outputs.
-loglevel = 'debug'
\ No newline at end of file
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+if worker_class == 'gevent':
+    # With hundreds of requests in flight per worker, the per-process pools sized for
+    # sync workers become the bottleneck. Explicit settings still win.
+    os.environ.setdefault('HTTP_POOL_SIZE', '100')
+    os.environ.setdefault('PIPELINE_WORKERS', '256')
+    os.environ.setdefault('FANOUT_WORKERS', '256')
+    os.environ.setdefault('DB_POOL_SIZE', '20')
+
+
+def on_starting(server):
+    # Workers inherit this run ID, so /metrics sums only this instance's snapshots
+    from app.services.metrics import start_run
+    start_run()
+
+
+def post_fork(server, worker):
+    worker.boot_started = time.perf_counter()
+    # The log queue's listener thread does not survive fork
+    from app.log import configure_logging
+    configure_logging()
+
+    if worker_class == 'gevent':
+        # psycopg2 blocks the whole worker on queries unless it yields to the gevent hub.
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+
+    if preload_app:
+        from app import init_worker
+        init_worker(worker.app.wsgi())
+
+
+def post_worker_init(worker):
+    worker.log.info(f'Worker {worker.pid} ready in {time.perf_counter() - worker.boot_started:.3f}s')
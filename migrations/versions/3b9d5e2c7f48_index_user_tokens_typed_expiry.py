@@ -0,0 +1,57 @@
+"""index user tokens, store expires_at as a timestamp
+
+Revision ID: 3b9d5e2c7f48
+Revises: e83b0c4f7a15
+Create Date: 2026-10-18 11:26:09.718334
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9d5e2c7f48'
+down_revision = 'e83b0c4f7a15'
+branch_labels = None
+depends_on = None
+
+user = sa.table('user', sa.column('id', sa.Integer()), sa.column('expires_at', sa.DateTime()))
+
+
+def _parse(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def upgrade():
+    bind = op.get_bind()
+    # Only Postgres converts the stored text in place (postgresql_using); elsewhere the
+    # batch copy's CAST mangles it (SQLite keeps just the leading year), so rewrite it.
+    saved = []
+    if bind.dialect.name != 'postgresql':
+        saved = bind.execute(sa.text('SELECT id, expires_at FROM "user" WHERE expires_at IS NOT NULL')).all()
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('expires_at',
+               existing_type=sa.String(),
+               type_=sa.DateTime(),
+               existing_nullable=True,
+               postgresql_using='expires_at::timestamp without time zone')
+        batch_op.create_index(batch_op.f('ix_user_access_token'), ['access_token'], unique=False)
+        batch_op.create_index(batch_op.f('ix_user_user_id'), ['user_id'], unique=False)
+    for user_id, expires_at in saved:
+        op.execute(user.update().where(user.c.id == user_id).values(expires_at=_parse(expires_at)))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_user_id'))
+        batch_op.drop_index(batch_op.f('ix_user_access_token'))
+        batch_op.alter_column('expires_at',
+               existing_type=sa.DateTime(),
+               type_=sa.String(),
+               existing_nullable=True,
+               postgresql_using='expires_at::varchar')
@@ -0,0 +1,7 @@
+from app import db
+
+
+class CountryChart(db.Model):
+    country = db.Column(db.String, primary_key=True)
+    payload = db.Column(db.JSON, nullable=False)
+    fetched_at = db.Column(db.DateTime, nullable=False)
@@ -0,0 +1,7 @@
+from app import db
+
+
+class GeocodeCache(db.Model):
+    key = db.Column(db.String, primary_key=True)
+    data = db.Column(db.JSON, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
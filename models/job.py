@@ -0,0 +1,25 @@
+from app import db
+import datetime
+
+class PlaylistJob(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    status = db.Column(db.String, nullable=False, default='queued')
+    payload = db.Column(db.JSON, nullable=False)
+    result = db.Column(db.JSON)
+    error = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_playlist_job_status_created_at', 'status', 'created_at'),)
+
+    def json(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat()
+        }
@@ -1,14 +1,39 @@
 from app import db
+from sqlalchemy import delete, select
 import datetime
 
 class TemporaryStorage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     key = db.Column(db.String, unique=True, nullable=False)
     value = db.Column(db.String, nullable=False)
-    expires_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
 
     @staticmethod
-    def cleanup():
+    def put(key, value, expires_at):
+        db.session.add(TemporaryStorage(key=key, value=value, expires_at=expires_at))
+        db.session.commit()
+
+    @staticmethod
+    def pop(key):
+        # Single round trip: DELETE ... RETURNING hands back the value and consumes the row
         now = datetime.datetime.utcnow()
-        TemporaryStorage.query.filter(TemporaryStorage.expires_at < now).delete()
+        value = db.session.execute(
+            delete(TemporaryStorage)
+            .where(TemporaryStorage.key == key, TemporaryStorage.expires_at >= now)
+            .returning(TemporaryStorage.value)
+        ).scalar_one_or_none()
         db.session.commit()
+        return value
+
+    @staticmethod
+    def cleanup(batch_size=1000):
+        # Delete in bounded batches (each its own short transaction) using the expires_at index
+        now = datetime.datetime.utcnow()
+        deleted = 0
+        while True:
+            expired_ids = select(TemporaryStorage.id).where(TemporaryStorage.expires_at < now).limit(batch_size)
+            result = db.session.execute(delete(TemporaryStorage).where(TemporaryStorage.id.in_(expired_ids)))
+            db.session.commit()
+            deleted += result.rowcount
+            if result.rowcount < batch_size:
+                return deleted
@@ -0,0 +1,20 @@
+from app import db
+
+
+class TrackFeatures(db.Model):
+    track_id = db.Column(db.String, primary_key=True)
+    uri = db.Column(db.String, nullable=False)
+    energy = db.Column(db.Float)
+    valence = db.Column(db.Float)
+    acousticness = db.Column(db.Float)
+    danceability = db.Column(db.Float)
+
+    def json(self):
+        return {
+            "id": self.track_id,
+            "uri": self.uri,
+            "energy": self.energy,
+            "valence": self.valence,
+            "acousticness": self.acousticness,
+            "danceability": self.danceability
+        }
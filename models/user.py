@@ -3,10 +3,14 @@ from app import db
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    access_token = db.Column(db.String)
+    access_token = db.Column(db.String, index=True)
     refresh_token = db.Column(db.String)
-    expires_at = db.Column(db.String)
-    user_id = db.Column(db.String)
+    previous_access_token = db.Column(db.String, index=True)
+    expires_at = db.Column(db.DateTime)
+    user_id = db.Column(db.String, unique=True, index=True)
+    # Failed scheduled refreshes in a row, and when the next one may be tried
+    refresh_failures = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    refresh_retry_at = db.Column(db.DateTime)
     
     def json(self):
         return {
@@ -0,0 +1,9 @@
+from app import db
+
+
+class WeatherPlaylist(db.Model):
+    country = db.Column(db.String, primary_key=True)
+    bucket = db.Column(db.String, primary_key=True)
+    track_uris = db.Column(db.JSON, nullable=False)
+    chart_fetched_at = db.Column(db.DateTime, nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False)
@@ -0,0 +1,18 @@
+import pytest
+
+from benchmarks.harness import BENCH_ACCESS_TOKEN, make_app
+
+
+@pytest.fixture(scope='session')
+def app():
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth():
+    return {'Authorization': f'Bearer {BENCH_ACCESS_TOKEN}'}
@@ -0,0 +1,26 @@
+import json
+import logging
+import queue
+
+from app.log import JsonFormatter, RedactedQueueHandler, RedactingFilter
+
+
+def test_logged_exception_is_redacted():
+    records = queue.SimpleQueue()
+    handler = RedactedQueueHandler(records)
+    handler.addFilter(RedactingFilter())
+    logger = logging.getLogger('tests.log')
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        try:
+            raise RuntimeError('503 Server Error for url: https://eu1.locationiq.com/v1/search.php?key=secret123&q=Oslo')
+        except RuntimeError:
+            logger.exception('Pipeline stage location failed')
+    finally:
+        logger.removeHandler(handler)
+
+    entry = json.loads(JsonFormatter().format(records.get_nowait()))
+    assert entry['msg'] == 'Pipeline stage location failed'
+    assert 'secret123' not in entry['exc']
+    assert 'key=[REDACTED]' in entry['exc']
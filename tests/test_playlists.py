@@ -0,0 +1,63 @@
+import pytest
+import requests
+
+from app.services import playlists
+from app.services.ratelimit import RateLimited
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    calls = []
+    failures = {}
+
+    def send(method, url, access_token, payload, attempts=3):
+        uris = payload['uris']
+        calls.append((method, uris[0] if uris else None, len(uris)))
+        outcome = failures.get(uris[0] if uris else None, 201)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+    monkeypatch.setattr(playlists, '_send_with_retry', send)
+    return calls, failures
+
+
+def uris(count):
+    return [f'spotify:track:{i}' for i in range(count)]
+
+
+def test_chunks_with_offset():
+    assert [(start, len(chunk)) for start, chunk in playlists.chunks_with_offset(uris(250))] == [(0, 100), (100, 100), (200, 50)]
+    assert playlists.chunks_with_offset([]) == []
+
+
+def test_all_chunks_written(sent):
+    calls, _ = sent
+    report = playlists.add_tracks('p1', uris(250), 'token')
+    assert report == {'added': 250, 'failed': 0, 'failed_chunks': []}
+    assert [call[0] for call in calls] == ['POST', 'POST', 'POST']
+
+
+def test_replace_puts_first_chunk(sent):
+    calls, _ = sent
+    playlists.add_tracks('p1', uris(150), 'token', replace=True)
+    assert [(method, count) for method, _, count in calls] == [('PUT', 100), ('POST', 50)]
+
+
+@pytest.mark.parametrize('failure, status', [
+    (requests.ConnectionError('connection reset'), None),
+    (RateLimited('spotify', 1.0), 503),
+    (500, 500),
+])
+def test_failed_chunk_does_not_stop_the_rest(sent, failure, status):
+    calls, failures = sent
+    failures['spotify:track:100'] = failure
+    report = playlists.add_tracks('p1', uris(250), 'token')
+    assert len(calls) == 3
+    assert report == {'added': 150, 'failed': 100, 'failed_chunks': [{'offset': 100, 'count': 100, 'status': status}]}
@@ -0,0 +1,50 @@
+import time
+
+import pytest
+
+from app.services import ratelimit
+
+
+@pytest.fixture
+def bucket(tmp_path, monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT_DIR', str(tmp_path))
+    monkeypatch.delenv('RATE_LIMIT_MAX_WAIT', raising=False)
+    monkeypatch.setenv('RATE_LIMIT_TESTPROVIDER', '5,1')
+    return 'testprovider'
+
+
+def test_call_past_the_burst_queues_for_a_token(bucket):
+    ratelimit.acquire(bucket)
+    start = time.monotonic()
+    ratelimit.acquire(bucket)
+    assert 0.1 < time.monotonic() - start < 0.4
+
+
+def test_default_wait_covers_the_refill_interval():
+    assert ratelimit.max_wait(2) == 1.0
+    assert ratelimit.max_wait(1) == 2.0
+    assert ratelimit.max_wait(10) == 0.25
+
+
+def test_call_is_shed_when_the_wait_exceeds_the_cap(bucket, monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT_MAX_WAIT', '0.05')
+    ratelimit.acquire(bucket)
+    with pytest.raises(ratelimit.RateLimited) as raised:
+        ratelimit.acquire(bucket)
+    assert raised.value.status_code == 503
+    assert 0 < raised.value.retry_after <= 0.2
+
+
+def test_patience_queues_calls_the_cap_would_shed(bucket, monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT_MAX_WAIT', '0.05')
+    ratelimit.acquire(bucket)
+    with ratelimit.patience(1):
+        ratelimit.acquire(bucket)
+    assert ratelimit.max_wait(5) == 0.05
+
+
+def test_unusable_bucket_dir_lets_calls_through(monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT_DIR', '/proc/no-such-dir')
+    monkeypatch.setenv('RATE_LIMIT_TESTPROVIDER', '1,1')
+    for _ in range(3):
+        ratelimit.acquire('testprovider')
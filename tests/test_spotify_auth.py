@@ -0,0 +1,24 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.routes import spotify_auth
+
+
+@pytest.mark.parametrize('dialect_insert', ['upsert', 'orm'])
+def test_login_keeps_replaced_token_valid(app, monkeypatch, dialect_insert):
+    if dialect_insert == 'orm':
+        # No dialect-specific INSERT ... ON CONFLICT: take the ORM fallback
+        monkeypatch.setattr(spotify_auth, 'sqlite', SimpleNamespace(insert=None))
+    user_id = f'rotating-{dialect_insert}'
+    with app.test_request_context():
+        first = spotify_auth.update_or_create_user(user_id, {'access_token': f'{user_id}-1', 'refresh_token': 'r1',
+                                                             'expires_in': 3600})
+        assert spotify_auth.get_user_from_token(f'{user_id}-1')['id'] == first['id']
+
+        second = spotify_auth.update_or_create_user(user_id, {'access_token': f'{user_id}-2', 'expires_in': 3600})
+        assert second['id'] == first['id']
+        assert second['refresh_token'] == 'r1'
+        # The old token is no longer cached as current, but still resolves to the user
+        assert spotify_auth.get_user_from_token(f'{user_id}-1')['access_token'] == f'{user_id}-2'
+        assert spotify_auth.get_user_from_token(f'{user_id}-2')['id'] == first['id']
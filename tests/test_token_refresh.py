@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+
+from app import db
+from app.routes import spotify_auth
+from models.user import User
+
+
+def _expiring_user(user_id):
+    user = User(user_id=user_id, access_token=f'{user_id}-access', refresh_token=f'{user_id}-refresh',
+                expires_at=datetime.now() + timedelta(minutes=1))
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def test_rejected_refresh_token_is_dropped(app, monkeypatch):
+    calls = []
+
+    def rejected(refresh_token):
+        calls.append(refresh_token)
+        return {'error': 'invalid_grant', 'error_description': 'Refresh token revoked'}
+
+    monkeypatch.setattr(spotify_auth, 'refresh_access_token', rejected)
+    with app.app_context():
+        user_id = _expiring_user('revoked')
+        assert spotify_auth.refresh_expiring_tokens() == 0
+        assert db.session.get(User, user_id).refresh_token is None
+        spotify_auth.refresh_expiring_tokens()
+    assert calls == ['revoked-refresh']
+
+
+def test_transient_failure_backs_off(app, monkeypatch):
+    calls = []
+
+    def unavailable(refresh_token):
+        calls.append(refresh_token)
+        raise ConnectionError('Spotify unreachable')
+
+    monkeypatch.setattr(spotify_auth, 'refresh_access_token', unavailable)
+    with app.app_context():
+        user_id = _expiring_user('flaky')
+        spotify_auth.refresh_expiring_tokens()
+        spotify_auth.refresh_expiring_tokens()
+        user = db.session.get(User, user_id)
+        assert calls == ['flaky-refresh']
+        assert user.refresh_failures == 1
+        assert user.refresh_retry_at > datetime.now()
+        assert user.refresh_token == 'flaky-refresh'
+
+        monkeypatch.setattr(spotify_auth, 'refresh_access_token',
+                            lambda refresh_token: {'access_token': 'flaky-new', 'expires_in': 3600})
+        user.refresh_retry_at = datetime.now() - timedelta(seconds=1)
+        db.session.commit()
+        assert spotify_auth.refresh_expiring_tokens() == 1
+        user = db.session.get(User, user_id)
+        assert (user.access_token, user.refresh_failures, user.refresh_retry_at) == ('flaky-new', 0, None)
@@ -0,0 +1,63 @@
+import json
+import threading
+
+from requests import HTTPError
+
+from app.routes import weather
+from app.services import ratelimit
+
+# Keyed by normalized city, as the geocode cache passes it to the fetcher
+LOCATIONS = {
+    'paris': ('48.8566', '2.3522'),
+    'lyon': ('45.7640', '4.8357'),
+    'nice': ('43.7102', '7.2620'),
+    'lille': ('50.6292', '3.0573'),
+}
+
+
+def test_batch_streams_failures_first_and_paces_geocodes_to_the_budget(client, auth, tmp_path, monkeypatch):
+    # LocationIQ's real budget: two calls up front, then one every half second
+    monkeypatch.setenv('RATE_LIMIT_DIR', str(tmp_path))
+    monkeypatch.setenv('RATE_LIMIT_LOCATIONIQ', '2,2')
+    monkeypatch.delenv('RATE_LIMIT_MAX_WAIT', raising=False)
+    released = threading.Event()
+
+    def fetch_location(city):
+        ratelimit.acquire('locationiq')
+        if city not in LOCATIONS:
+            return []
+        lat, lon = LOCATIONS[city]
+        return [{'lat': lat, 'lon': lon, 'display_name': f'{city.title()}, France'}]
+
+    def fetch_weather(lat, lon):
+        # Held until the client has read the geocoding failure
+        if not released.wait(5):
+            raise HTTPError('weather never released')
+        if round(lat) == 44:
+            raise HTTPError('503 Server Error')
+        return {'weather': [{'main': 'Clear', 'description': 'clear sky'}], 'main': {'temp': 21, 'humidity': 40}}
+
+    songs = [{'uri': f'spotify:track:{i}', 'energy': i / 10, 'valence': 0.5, 'acousticness': 0.5, 'danceability': 0.5}
+             for i in range(10)]
+    monkeypatch.setattr(weather, 'fetch_location_data', fetch_location)
+    monkeypatch.setattr(weather, 'fetch_weather_data', fetch_weather)
+    monkeypatch.setattr(weather, 'get_chart_unless_precomputed', lambda country, access_token: songs)
+    monkeypatch.setattr(weather, 'write_playlist', lambda user_id, name, track_uris, access_token, reuse_existing: {
+        'playlist_id': name, 'playlist_name': name, 'added': len(track_uris), 'failed': 0, 'reused': False})
+
+    response = client.post('/weather/batch', json={'cities': ['Paris', 'Lyon', 'Atlantis', 'Nice', 'Lille']},
+                           headers=auth, buffered=False)
+    assert response.mimetype == 'application/x-ndjson'
+    chunks = iter(response.response)
+    first = json.loads(next(chunks))
+    released.set()
+    lines = [first] + [json.loads(chunk) for chunk in chunks]
+    response.close()
+
+    assert first == {'city': 'Atlantis', 'error': 'Location not found', 'stage': 'location', 'status': 404}
+    assert lines[1] == {'city': 'Nice', 'error': 'Upstream call failed', 'stage': 'weather', 'status': 502}
+    playlists = {line['city']: line for line in lines[2:]}
+    assert sorted(playlists) == ['Lille', 'Lyon', 'Paris']
+    for city, line in playlists.items():
+        assert line == {'city': city, 'temperature': 21, 'playlist': f'{city} Clear Sky', 'tracks_added': 10,
+                        'tracks_failed': 0, 'playlist_reused': False}
@@ -0,0 +1,12 @@
+import pytest
+
+
+@pytest.mark.parametrize('headers', [{}, {'Authorization': 'garbage'}, {'Authorization': 'Bearer '}])
+def test_job_poll_without_bearer_token_is_401(client, headers):
+    response = client.get('/weather/jobs/some-job', headers=headers)
+    assert response.status_code == 401
+    assert response.get_json() == {'error': 'Missing or malformed Authorization header'}
+
+
+def test_job_poll_unknown_job_is_404(client, auth):
+    assert client.get('/weather/jobs/some-job', headers=auth).status_code == 404